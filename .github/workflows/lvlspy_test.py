@@ -1,10 +1,12 @@
 import numpy as np
 import requests, io
 import lvlspy.spcoll as lc
+import lvlspy.level as lv
+import lvlspy.species as ls
 import lvlspy.transition as lt
 
 from lvlspy.io import xml, ensdf
-from lvlspy.calculate import evolve
+from lvlspy.calculate import evolve, isomer, weisskopf
 
 
 def get_collection():
@@ -111,6 +113,20 @@ def test_transitions():
     assert len(s.get_transitions()) == number_transitions
 
 
+def test_remove_transition_between_equal_levels():
+    ground = lv.Level(0.0, 1)
+    lev_a, lev_b = lv.Level(100.0, 3), lv.Level(100.0, 3)
+    s = ls.Species("x", levels=[ground, lev_a, lev_b])
+    trans_a = lt.Transition(lev_a, ground, 1.0)
+    trans_b = lt.Transition(lev_b, ground, 2.0)
+    s.add_transition(trans_a)
+    s.add_transition(trans_b)
+    s.remove_transition(trans_b)
+    assert len(s.get_transitions()) == 1
+    assert s.get_transitions()[0] is trans_a
+    assert s.get_level_to_level_transition(lev_a, ground) is trans_a
+
+
 def test_einstein():
     coll = get_collection()
     s = coll.get()["al26"]
@@ -196,3 +212,320 @@ def test_evolution():
     y, f = evolve.newton_raphson(s, 1e9, y0, time)
     assert np.sum(f[:, -1]) - 22 < 1e-4
     assert np.sum(y[:, -1]) - 1.0 < 1e-5
+
+
+def test_level_index():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    levs = s.get_levels()
+    assert s.get_level_index(levs[1]) == 1
+    levs[1].update_energy(1.0e5)
+    assert s.get_levels()[-1] == levs[1]
+    assert s.get_level_index(levs[1]) == len(levs) - 1
+
+
+def test_rate_matrices():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    n = len(s.get_levels())
+    temps = np.array([1.0e8, 1.0e9])
+    rms = s.compute_rate_matrices(temps)
+    assert rms.shape == (2, n, n)
+    assert np.allclose(rms[1], s.compute_rate_matrix(1.0e9))
+
+
+def test_sparse_rate_matrix():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    rm = s.compute_rate_matrix(1.0e9, sparse=True)
+    assert np.allclose(rm.toarray(), s.compute_rate_matrix(1.0e9))
+
+
+def test_cache():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    s.enable_cache(maxsize=4)
+    rm = s.compute_rate_matrix(1.0e9)
+    assert s.compute_rate_matrix(1.0e9) is rm
+    assert s.get_cache_info()["hits"] == 1
+    trans = s.get_transitions()[0]
+    trans.update_einstein_a(2.0 * trans.get_einstein_a())
+    assert s.get_cache_info()["currsize"] == 0
+    s.disable_cache()
+    assert s.get_cache_info() is None
+
+
+def test_partition_function():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    temps = np.array([0.0, 1.0e7, 1.0e9])
+    p = s.compute_equilibrium_probabilities(temps)
+    assert p.shape == (3, len(s.get_levels()))
+    assert np.allclose(p[2], s.compute_equilibrium_probabilities(1.0e9))
+    g = s.compute_partition_function(temps)
+    assert g[0] == s.get_levels()[0].get_multiplicity()
+    assert g[2] > g[1]
+
+
+def test_eigen_evolution():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    levs = s.get_levels()
+    y0 = np.zeros(len(levs))
+    y0[0] = 1.0
+    time = np.linspace(0, 1.0e-3, 1000)
+    y, f, cond = evolve.eigen(s, 1e9, y0, time)
+    assert y.shape == (len(levs), len(time))
+    assert cond >= 1.0
+    assert np.sum(y[:, -1]) - 1.0 < 1e-5
+
+
+def test_trajectory_evolution():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    levs = s.get_levels()
+    y0 = np.zeros(len(levs))
+    y0[0] = 1.0
+    time = np.linspace(0, 1.0e-3, 20)
+    y, f = evolve.trajectory(s, lambda t: 1.0e9 * (1.0 - 100.0 * t), y0, time)
+    assert y.shape == (len(levs), len(time))
+    assert np.sum(y[:, -1]) - 1.0 < 1e-5
+    y, f = evolve.trajectory(s, np.full(len(time), 1.0e9), y0, time)
+    y1, f1 = evolve.csc(s, 1.0e9, y0, time)
+    assert np.allclose(y, y1, atol=1e-5)
+
+
+def test_trajectory_fast_transient():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    levs = s.get_levels()
+    y0 = np.zeros(len(levs))
+    y0[0] = 1.0
+    time = np.logspace(-9, 2, 50)
+
+    def temp(t):
+        return 1.0e8 + 3.0e9 * np.exp(-t / 1.0e-6)
+
+    y, f = evolve.trajectory(s, temp, y0, time)
+    knots = np.logspace(-9, 2, 2000)
+    y1, f1 = evolve.trajectory(s, temp, y0, time, knots=knots)
+    assert np.allclose(y, y1, atol=1e-4)
+
+
+def test_batched_evolution():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    levs = s.get_levels()
+    y0 = np.zeros((len(levs), 2))
+    y0[0, 0] = 1.0
+    y0[1, 1] = 1.0
+    time = np.linspace(0, 1.0e-3, 100)
+    y, f = evolve.csc(s, 1e9, y0, time)
+    assert y.shape == (len(levs), 2, len(time))
+    y1, f1 = evolve.csc(s, 1e9, y0[:, 1], time)
+    assert np.allclose(y[:, 1, :], y1)
+
+
+def test_isomer_temperature_sweep():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    temps = np.array([1.0e8, 5.0e8, 1.0e9])
+    r = isomer.temperature_sweep(temps, s, max_workers=2)
+    assert r["l_low_high"].shape == (len(temps),)
+    assert r["g1_in"].shape == (len(temps), len(s.get_levels()) - 2)
+    rates = isomer.effective_rate(temps[1], s)
+    assert np.isclose(r["l_high_low"][1], rates[1])
+
+
+def test_isomer_sweep_ensemble_weights():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    temps = np.array([5.0e8, 1.0e9])
+    for max_workers in [1, 2]:
+        r = isomer.temperature_sweep(
+            temps, s, level_low=1, level_high=3, max_workers=max_workers
+        )
+        for i, t in enumerate(temps):
+            w = isomer.ensemble_weights(t, s, level_low=1, level_high=3)
+            assert np.allclose(r["w_low"][i], w[0])
+            assert np.allclose(r["w_high"][i], w[1])
+            assert np.allclose(r["r_lowk"][i], w[4])
+            assert np.allclose(r["r_highk"][i], w[5])
+            assert np.allclose(r["g_low"][i], w[6])
+            assert np.allclose(r["g_high"][i], w[7])
+
+
+def test_isomer_multi_pair():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    pairs = [(0, 1), (0, 2)]
+    rates, gammas = isomer.multi_pair_rates(1.0e9, s, pairs)
+    for (level_low, level_high), r, g in zip(pairs, rates, gammas):
+        ref = isomer.effective_rate(1.0e9, s, level_low, level_high)
+        assert np.allclose(r, ref)
+        assert len(g) == 4
+
+
+def test_weisskopf_array():
+    w = weisskopf.Weisskopf()
+    e = [np.array([1000.0, 2500.0]), np.array([0.0, 400.0])]
+    j = [np.array([2, 3]), np.array([0, 1])]
+    p = [np.array([1, -1]), np.array([1, 1])]
+    ein_a = w.estimate_array(e, j, p, 26)
+    for i in range(2):
+        ref = w.estimate(
+            [e[0][i], e[1][i]], [j[0][i], j[1][i]], [p[0][i], p[1][i]], 26
+        )
+        assert np.isclose(ein_a[i], ref)
+
+
+def test_weisskopf_mass_number_table():
+    w, w_a = weisskopf.Weisskopf(), weisskopf.Weisskopf(26)
+    for j in range(1, 5):
+        assert np.isclose(
+            w_a.rate_elec(1000.0, 0.0, j, 26), w.rate_elec(1000.0, 0.0, j, 26)
+        )
+        assert np.isclose(
+            w_a.rate_mag(1000.0, 0.0, j, 26), w.rate_mag(1000.0, 0.0, j, 26)
+        )
+
+
+def test_transition_adjacency():
+    coll = get_collection()
+    s = coll.get()["al26"]
+    adjacency = s.get_transition_adjacency()
+    assert adjacency.sum() == len(s.get_transitions())
+    trans = s.get_transitions()[:2]
+    for t in trans:
+        s.remove_transition(t)
+    assert s.get_transition_adjacency().sum() == adjacency.sum() - 2
+    s.add_transitions(trans)
+    assert np.array_equal(s.get_transition_adjacency(), adjacency)
+
+
+def get_species_data(s):
+    # The level energies and the (upper index, lower index, Einstein A) of
+    # the transitions of a species.
+    return [lev.get_energy() for lev in s.get_levels()], [
+        (
+            s.get_level_index(t.get_upper_level()),
+            s.get_level_index(t.get_lower_level()),
+            t.get_einstein_a(),
+        )
+        for t in s.get_transitions()
+    ]
+
+
+def test_ensdf_bulk_loader():
+    ref = get_ensdf_collection().get()["al26"]
+    coll, report = ensdf.load_ensdf_files(["ensdf.026"], max_workers=2)
+    s = coll.get()["al26"]
+    assert "al26" in report["ensdf.026"]["species"]
+    assert get_species_data(s) == get_species_data(ref)
+
+
+def test_ensdf_index():
+    ref = get_ensdf_collection().get()["al26"]
+    index = ensdf.build_ensdf_index("ensdf.026")
+    assert "al26" in index["species"]
+    coll = lc.SpColl()
+    ensdf.update_from_ensdf(coll, "ensdf.026", "al26", use_index=True)
+    assert get_species_data(coll.get()["al26"]) == get_species_data(ref)
+
+
+def write_ensdf_cards(file, cards):
+    # Writes al26 level (L) and gamma (G) cards of an energy and a J^pi or
+    # multipolarity, and blank cards ending the datasets, to a small ENSDF
+    # file.
+    with open(file, "w") as f:
+        for card, energy, value in cards:
+            if card == "L":
+                line = f" 26AL  L {energy:<10}  {value:<18}"
+            elif card == "G":
+                line = f" 26AL  G {energy:<10}  {'100':<8}  {value:<10}"
+            else:
+                line = ""
+            f.write(line.ljust(80) + "\n")
+
+
+def test_ensdf_tolerance():
+    write_ensdf_cards(
+        "tol.ens",
+        [
+            ("L", "0.0", "2+"),
+            ("L", "500.0", "3+"),
+            ("L", "500.8", "3+"),
+            ("L", "1000.0", "2+"),
+            ("G", "499.5", "M1"),
+        ],
+    )
+    coll = lc.SpColl()
+    ensdf.update_from_ensdf(coll, "tol.ens", "al26")
+    s = coll.get()["al26"]
+    levs = s.get_levels()
+    # 500.8 keV is closer to 1000 - 499.5 keV than the first match, 500 keV
+    assert s.get_level_to_level_transition(levs[3], levs[2]) is not None
+    assert s.get_level_to_level_transition(levs[3], levs[1]) is None
+
+    coll = lc.SpColl()
+    ensdf.update_from_ensdf(coll, "tol.ens", "al26", tol=0.2)
+    assert len(coll.get()["al26"].get_transitions()) == 0
+
+
+def test_ensdf_unplaced_gamma():
+    write_ensdf_cards(
+        "unplaced.ens",
+        [
+            ("G", "120.0", "M1"),
+            ("L", "0.0", "2+"),
+            ("L", "300.0", "3+"),
+            ("G", "300.0", "M1"),
+        ],
+    )
+    coll = lc.SpColl()
+    ensdf.update_from_ensdf(coll, "unplaced.ens", "al26")
+    s = coll.get()["al26"]
+    assert len(s.get_levels()) == 2
+    assert len(s.get_transitions()) == 1
+
+
+def test_ensdf_datasets():
+    # The second dataset, like a decay dataset, repeats some of the adopted
+    # levels without a 0 keV level.
+    write_ensdf_cards(
+        "datasets.ens",
+        [
+            ("L", "0.0", "5+"),
+            ("L", "417.0", "3+"),
+            ("G", "417.0", "E2"),
+            ("L", "1057.7", "1+"),
+            ("G", "640.7", "E2"),
+            ("", "", ""),
+            ("L", "417.0", "3+"),
+            ("L", "2069.0", "1+"),
+            ("G", "1652.0", "E2"),
+            ("", "", ""),
+        ],
+    )
+    coll = lc.SpColl()
+    ensdf.update_from_ensdf(coll, "datasets.ens", "al26")
+    ref = get_species_data(coll.get()["al26"])
+    assert ref[0] == [0.0, 417.0, 1057.7]
+    assert len(ref[1]) == 2
+
+    coll = lc.SpColl()
+    ensdf.update_from_ensdf(coll, "datasets.ens", "al26", use_index=True)
+    assert get_species_data(coll.get()["al26"]) == ref
+
+    coll, report = ensdf.load_ensdf_files(["datasets.ens"], max_workers=1)
+    assert not report["datasets.ens"]["failures"]
+    assert get_species_data(coll.get()["al26"]) == ref
+
+
+def test_ensdf_write():
+    coll = get_ensdf_collection()
+    ensdf.write_to_ensdf(coll, "al26_out.ens")
+    new = lc.SpColl()
+    ensdf.update_from_ensdf(new, "al26_out.ens", "al26")
+    ref, s = coll.get()["al26"], new.get()["al26"]
+    assert get_species_data(s) == get_species_data(ref)
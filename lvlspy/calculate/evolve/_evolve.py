@@ -3,9 +3,13 @@ Module to handle the evolution of the level system based on temperature
 """
 
 import numpy as np
-from scipy.sparse import csc_matrix
+from scipy.integrate import solve_ivp
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse import csc_matrix, identity, kron
 from scipy.sparse.linalg import expm_multiply
 
+__all__ = ["newton_raphson", "csc", "eigen", "trajectory"]
+
 
 def newton_raphson(sp, temp, y0, time, tol=1e-6):
     """
@@ -16,81 +20,318 @@ def newton_raphson(sp, temp, y0, time, tol=1e-6):
 
         ``temp`` (:obj:`float`): The temperature in K to evolve the system at.
 
-        ``y0`` (:obj:`numpy.array`): 1D array containing the initial distribution.
+        ``y0`` (:obj:`numpy.array`): 1D array containing the initial distribution, or 2D
+        array of size n_levels*k containing k initial distributions as columns.
 
         ``time`` (:obj:`numpy.array`,optional): An array containing the time steps.
         ``tol`` (:obj:`float`): The convergence condition for the method. Defaults to 1e-6.
+        Since the system is linear, each step converges in a single solve, so this argument
+        is only kept for backwards compatibility.
 
     Returns:
         ``y`` (:obj:`numpy.array`): 2D array of size n_levels*n_time containing the evolved system.
+        For a 2D ``y0``, the array is 3D of size n_levels*k*n_time.
 
         ``fug`` (:obj:`numpy.array`) 2D array containing the fugacities as a function of time
     """
 
-    y = np.empty((len(y0), len(time)))
-    fug = np.empty((len(y0), len(time)))
-    y[:, 0] = y0
+    # pylint: disable=unused-argument
+    y = np.empty(np.shape(y0) + (len(time),))
+    y[..., 0] = y0
 
     rm = sp.compute_rate_matrix(
         temp
     )  # calculate the rate matrix of the species
     eq_prob = sp.compute_equilibrium_probabilities(temp)
-    y_dt = y[:, 0]
-    fug[:, 0] = y_dt / eq_prob
+
+    # The implicit step (I - dt * rm) y_i = y_(i-1) is linear, so a single
+    # solve gives the Newton-Raphson solution.  The LU factorization is
+    # only recomputed when the time step changes.  All the columns of a 2D
+    # y0 are solved for together.
+    lu_piv = None
+    dt_lu = None
     for i in range(1, len(time)):
         dt = time[i] - time[i - 1]
-        matrix = np.identity(len(y_dt)) - dt * rm
-        delta = np.ones(len(y_dt))
-        while max(delta) > tol:
-            delta = np.linalg.solve(
-                matrix, -_f_vector(y_dt, y[:, i - 1], matrix)
-            )
-            y_dt = y_dt + delta
-        y[:, i] = y_dt
-        fug[:, i] = y[:, i] / eq_prob
+        if dt_lu is None or not np.isclose(dt, dt_lu, rtol=1e-12, atol=0):
+            lu_piv = lu_factor(np.identity(len(y0)) - dt * rm)
+            dt_lu = dt
+        y[..., i] = lu_solve(lu_piv, y[..., i - 1])
 
-    return y, fug
+    return y, _fugacities(y, eq_prob)
 
 
-def _f_vector(y_dt, y_i, rm):
-    return np.matmul(rm, y_dt) - y_i
+def _fugacities(y, eq_prob):
+    # The equilibrium probabilities are per level and, if 2D, per time.
+    if eq_prob.ndim == 1:
+        shape = (-1,) + (1,) * (y.ndim - 1)
+    else:
+        shape = (eq_prob.shape[0],) + (1,) * (y.ndim - 2) + (-1,)
+    return y / eq_prob.reshape(shape)
 
 
 def csc(sp, temp, y0, time):
     """Evolves a system using sparse solver
 
+    The solution is propagated from each time stamp to the next.  Each run of equal time
+    steps is evolved with a single call to :obj:`scipy.sparse.linalg.expm_multiply`, so the
+    norms of the rate matrix are only estimated once per run, while its trace is computed
+    once for all the runs.
+
     Args:
         ``sp`` (:obj:`lvlspy.species.Species`): The species containing the levels to be evolved
 
         ``temp`` (:obj:`float`): The temperature in K to evolve the system at.
 
-        ``y0`` (:obj:`numpy.array`): Array containing the initial condition.
+        ``y0`` (:obj:`numpy.array`): Array containing the initial condition at ``time[0]``,
+        or 2D array of size n_levels*k containing k initial conditions as columns.
 
         ``time`` (:obj:`numpy.array`): An array containing the time stamps to evolve the system
 
     Returns:
-        ``sol_expm_solver`` (:obj:`numpy.array`): A 2D array containing the evolved system
+        ``sol_expm_solver`` (:obj:`numpy.array`): A 2D array of size n_levels*n_time
+        containing the evolved system, which is ``y0`` at ``time[0]``. For a 2D ``y0``, the
+        array is 3D of size n_levels*k*n_time.
 
         ``fug`` (:obj:`numpy.array`) 2D array containing the fugacities as a function of time
     """
 
+    rm_csc = sp.compute_rate_matrix(temp, sparse=True)
+    eq_prob = sp.compute_equilibrium_probabilities(temp)
+
+    dt = np.diff(time)
+    trace = rm_csc.diagonal().sum()
+
+    sol_expm_solver = np.empty(np.shape(y0) + (len(time),))
+    sol_expm_solver[..., 0] = y0
+
+    # Each run of equal time steps is propagated from the last solution
+    # with a single call, so the work scales with the time steps and not
+    # with the elapsed time, and the norms of the rate matrix are estimated
+    # once per run.
+    i = 0
+    while i < len(dt):
+        n = _get_run_length(dt, i)
+        if n == 1:
+            sol_expm_solver[..., i + 1] = expm_multiply(
+                dt[i] * rm_csc,
+                sol_expm_solver[..., i],
+                traceA=dt[i] * trace,
+            )
+        else:
+            sol = expm_multiply(
+                rm_csc,
+                sol_expm_solver[..., i],
+                start=0,
+                stop=time[i + n] - time[i],
+                num=n + 1,
+                endpoint=True,
+                traceA=trace,
+            )
+            sol_expm_solver[..., i + 1 : i + n + 1] = np.moveaxis(
+                sol[1:], 0, -1
+            )
+        i += n
+
+    return sol_expm_solver, _fugacities(sol_expm_solver, eq_prob)
+
+
+def _get_run_length(dt, i):
+    # Returns the number of time steps from i on that are equal to dt[i].
+    same = np.isclose(dt[i:], dt[i], rtol=1e-10, atol=0)
+    return len(same) if same.all() else int(np.argmin(same))
+
+
+def eigen(sp, temp, y0, time, max_cond=1.0e8):
+    """Evolves a system using the eigendecomposition of the rate matrix
+
+    The rate matrix is diagonalized once and the solution at all the time stamps is then
+    obtained with a single matrix product, which is efficient when the solution is needed
+    at many times. The slowest modes are only resolved to about the machine precision
+    times the largest rate, so very long evolutions of stiff systems are better done
+    with :meth:`csc`.
+
+    Args:
+        ``sp`` (:obj:`lvlspy.species.Species`): The species containing the levels to be evolved
+
+        ``temp`` (:obj:`float`): The temperature in K to evolve the system at.
+
+        ``y0`` (:obj:`numpy.array`): Array containing the initial condition at ``time[0]``,
+        or 2D array of size n_levels*k containing k initial conditions as columns.
+
+        ``time`` (:obj:`numpy.array`): An array containing the time stamps to evolve the system
+
+        ``max_cond`` (:obj:`float`, optional): The largest condition number of the matrix of
+        eigenvectors for which the decomposition is used. Beyond it, or if the decomposition
+        fails, the system is evolved with :meth:`csc` instead. Defaults to 1e8.
+
+    Returns:
+        ``y`` (:obj:`numpy.array`): 2D array of size n_levels*n_time containing the evolved system.
+        For a 2D ``y0``, the array is 3D of size n_levels*k*n_time.
+
+        ``fug`` (:obj:`numpy.array`) 2D array containing the fugacities as a function of time
+
+        ``cond`` (:obj:`float`) The condition number of the matrix of eigenvectors. It is
+        infinite if the decomposition failed.
+    """
+
     rm = sp.compute_rate_matrix(temp)
     eq_prob = sp.compute_equilibrium_probabilities(temp)
-    rm_csc = csc_matrix(rm)
-    sol_expm_solver = np.empty([rm.shape[0], time.shape[0]])
-    sol_expm_solver[:, 0] = y0
-    fug = np.empty((len(y0), len(time)))
-    fug[:, 0] = y0 / eq_prob
-    for i in range(len(time) - 1):
-        y = expm_multiply(
-            rm_csc,
-            y0,
-            start=time[i],
-            stop=time[i + 1],
-            num=2,
-            endpoint=True,
-        )[0, :]
-        sol_expm_solver[:, i + 1] = y
-        fug[:, i + 1] = y / eq_prob
-
-    return sol_expm_solver, fug
+
+    try:
+        eig_val, eig_vec = np.linalg.eig(rm)
+        cond = np.linalg.cond(eig_vec)
+    except np.linalg.LinAlgError:
+        cond = np.inf
+
+    if not cond <= max_cond:
+        y, fug = csc(sp, temp, y0, time)
+        return y, fug, cond
+
+    # Expand the initial condition on the eigenvectors and evolve each
+    # mode independently.
+    coeffs = np.linalg.solve(eig_vec, y0)
+    modes = np.exp(np.outer(eig_val, np.asarray(time) - time[0]))
+    modes = modes.reshape(
+        (len(eig_val),) + (1,) * (coeffs.ndim - 1) + (len(time),)
+    )
+
+    y = np.real(np.tensordot(eig_vec, coeffs[..., np.newaxis] * modes, axes=1))
+
+    return y, _fugacities(y, eq_prob), cond
+
+
+def trajectory(sp, temp, y0, time, knots=None, **kwargs):
+    """Evolves a system along a temperature trajectory using an adaptive stiff integrator
+
+    By default, the rate matrix is computed at the temperature of each time the integrator
+    evaluates the system.  If trajectory knots are given, the rate matrices are instead
+    computed once at the knots and linearly interpolated in time between them.  The rate
+    matrix is also passed to the integrator as the analytic Jacobian.
+
+    Args:
+        ``sp`` (:obj:`lvlspy.species.Species`): The species containing the levels to be evolved
+
+        ``temp`` (:obj:`numpy.array` or function): The temperatures in K at the knots, or
+        at ``time`` if no knots are given, or a
+        `function <https://docs.python.org/3/library/stdtypes.html#functions>`_ that takes a
+        :obj:`float` time and returns the temperature in K.
+
+        ``y0`` (:obj:`numpy.array`): Array containing the initial condition at ``time[0]``,
+        or 2D array of size n_levels*k containing k initial conditions as columns.
+
+        ``time`` (:obj:`numpy.array`): An array containing the time stamps to evolve the system
+
+        ``knots`` (:obj:`numpy.array`, optional): The times at which the rate matrices are
+        computed, once per distinct temperature. If not set, the rate matrix is computed at
+        each time the integrator evaluates the system, with the temperature given by the
+        function or interpolated linearly in time between the values of the array.  This
+        follows fast changes of the temperature, while knots trade accuracy for fewer rate
+        matrix computations.
+
+        ``**kwargs``: Keyword arguments passed to :obj:`scipy.integrate.solve_ivp`, such
+        as ``method`` (defaults to "BDF"; "Radau" and "LSODA" are the other stiff
+        methods), ``rtol`` (defaults to 1e-6), and ``atol`` (defaults to 1e-12).
+
+    Returns:
+        ``y`` (:obj:`numpy.array`): 2D array of size n_levels*n_time containing the evolved system.
+        For a 2D ``y0``, the array is 3D of size n_levels*k*n_time.
+
+        ``fug`` (:obj:`numpy.array`) 2D array containing the fugacities as a function of time
+    """
+
+    kwargs = {"method": "BDF", "rtol": 1e-6, "atol": 1e-12, **kwargs}
+
+    if knots is None:
+        temperature = _get_temperature_function(temp, time)
+        t_time = np.array([temperature(t) for t in time])
+        _rate_matrix = _evaluate_rate_matrices(sp, temperature)
+    else:
+        knots, t_knots, t_time = _get_knots(temp, time, knots)
+        _rate_matrix = _interpolate_rate_matrices(sp, knots, t_knots)
+
+    # The integrator works on 1D states, so the columns of a 2D y0 are
+    # flattened and the Jacobian is the block matrix kron(rm, I).
+    shape = np.shape(y0)
+    if len(shape) == 1:
+        jac = _rate_matrix
+    else:
+
+        def jac(t):
+            return kron(
+                csc_matrix(_rate_matrix(t)), identity(shape[1]), format="csc"
+            )
+
+    sol = solve_ivp(
+        lambda t, y: (_rate_matrix(t) @ y.reshape(shape)).ravel(),
+        (time[0], time[-1]),
+        np.ravel(y0),
+        t_eval=time,
+        jac=lambda t, y: jac(t),
+        **kwargs,
+    )
+
+    if not sol.success:
+        raise RuntimeError(sol.message)
+
+    y = sol.y.reshape(shape + (len(time),))
+
+    return y, _fugacities(y, sp.compute_equilibrium_probabilities(t_time).T)
+
+
+def _interpolate_rate_matrices(sp, knots, t_knots):
+    # Returns the function of time interpolating linearly between the rate
+    # matrices at the knots, which are computed once per distinct
+    # temperature.
+    t_unique, i_knots = np.unique(t_knots, return_inverse=True)
+    rms = sp.compute_rate_matrices(t_unique)
+    i_knots = np.ravel(i_knots)
+
+    def _rate_matrix(t):
+        if len(knots) == 1 or t <= knots[0]:
+            return rms[i_knots[0]]
+        if t >= knots[-1]:
+            return rms[i_knots[-1]]
+        i = np.searchsorted(knots, t, side="right") - 1
+        frac = (t - knots[i]) / (knots[i + 1] - knots[i])
+        return (1.0 - frac) * rms[i_knots[i]] + frac * rms[i_knots[i + 1]]
+
+    return _rate_matrix
+
+
+def _evaluate_rate_matrices(sp, temperature):
+    # Returns the function of time computing the rate matrix at the
+    # temperature of that time.  The integrator evaluates the system and its
+    # Jacobian at the same times, so the last rate matrix is kept.
+    last = {}
+
+    def _rate_matrix(t):
+        t_k = float(temperature(t))
+        if t_k not in last:
+            last.clear()
+            last[t_k] = sp.compute_rate_matrix(t_k)
+        return last[t_k]
+
+    return _rate_matrix
+
+
+def _get_temperature_function(temp, time):
+    # Returns the temperature as a function of time.
+    if callable(temp):
+        return temp
+    time = np.asarray(time, dtype=float)
+    t_time = np.asarray(temp, dtype=float)
+    return lambda t: np.interp(t, time, t_time)
+
+
+def _get_knots(temp, time, knots):
+    # Returns the knots, the temperatures at the knots and the temperatures
+    # at the output times.
+    knots = np.asarray(knots, dtype=float)
+    if callable(temp):
+        return (
+            knots,
+            np.array([temp(t) for t in knots]),
+            np.array([temp(t) for t in time]),
+        )
+    t_knots = np.asarray(temp, dtype=float)
+    return knots, t_knots, np.interp(time, knots, t_knots)
@@ -3,7 +3,23 @@ Module to handle isomer related calculations. Functions are built based on the m
 `Gupta and Meyer (2001) <https://ui.adsabs.harvard.edu/abs/2001PhRvC..64b5805G/abstract>`_
 """
 
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse import diags, identity, issparse
+from scipy.sparse.linalg import splu
+
+__all__ = [
+    "transfer_properties",
+    "effective_rate",
+    "cascade_probabilities",
+    "ensemble_weights",
+    "temperature_sweep",
+    "multi_pair_rates",
+]
 
 
 def transfer_properties(rate_matrix, level_low, level_high):
@@ -11,7 +27,8 @@ def transfer_properties(rate_matrix, level_low, level_high):
 
     Args:
         ``rate_matrix`` (:obj:`numpy.array`) A 2D array containing the rate matrix
-        of a species at a given temperature
+        of a species at a given temperature. A :obj:`scipy.sparse` matrix is also
+        accepted, in which case the Transition Probability Matrix is sparse.
 
         ``level_low`` (:obj:`int`) Integer indicating the lower level the transition
         is moving to
@@ -41,46 +58,32 @@ def transfer_properties(rate_matrix, level_low, level_high):
 
     """
 
-    # setting in the rates going in to the levels
-    lambda_low_in = rate_matrix[level_low, :]
-    lambda_high_in = rate_matrix[level_high, :]
-
-    # remove entries corresponding the rows and columns to be removed
-    lambda_low_in = np.delete(lambda_low_in, [level_low, level_high])
-    lambda_high_in = np.delete(lambda_high_in, [level_low, level_high])
-
-    # setting the rates going out of the levels
-    lambda_low_out = rate_matrix[:, level_low]
-    lambda_high_out = rate_matrix[:, level_high]
+    if issparse(rate_matrix):
+        return _sparse_transfer_properties(rate_matrix, level_low, level_high)
 
-    # remove entries corresponding to the rows and columns to be removed
-    lambda_low_out = np.delete(lambda_low_out, [level_low, level_high])
-    lambda_high_out = np.delete(lambda_high_out, [level_low, level_high])
+    # indices of the levels kept in the reduced arrays
+    keep = _kept_levels(rate_matrix.shape[0], level_low, level_high)
 
     # extract the diagonal elements from the rate matrix as they are the
     # sum of all the rates into the level
     lambda_sum = np.diag(rate_matrix)
     # this array is the reduced array above without the removed levels
-    lambda_red = np.delete(lambda_sum, [level_low, level_high])
+    lambda_red = lambda_sum[keep]
 
-    f_low_out = lambda_low_out / lambda_sum[level_low]
-    f_high_out = lambda_high_out / lambda_sum[level_high]
+    # the rates going in to and out of the levels, without the entries of
+    # the removed rows and columns
+    f_low_in = rate_matrix[level_low, keep] / lambda_red
+    f_high_in = rate_matrix[level_high, keep] / lambda_red
 
-    f_low_in = lambda_low_in / lambda_red
-    f_high_in = lambda_high_in / lambda_red
+    f_low_out = rate_matrix[keep, level_low] / lambda_sum[level_low]
+    f_high_out = rate_matrix[keep, level_high] / lambda_sum[level_high]
 
-    # setting up the transfer matrix
-    tpm = rate_matrix
+    # setting up the transfer matrix with a single copy of the reduced rate
+    # matrix.  Its columns are divided by the diagonal terms in place, so
+    # the rows of the transposed view are.
+    tpm = rate_matrix[np.ix_(keep, keep)]
+    tpm /= lambda_red
     tpm = tpm.T
-    # remove the columns
-    tpm = np.delete(tpm, [level_low, level_high], axis=1)
-    # remove the rows
-    tpm = np.delete(tpm, [level_low, level_high], axis=0)
-
-    # Divide the row by the diagonal term
-    tpm = (
-        tpm / lambda_red[:, None]
-    )  # This only works if the arrays are numpy arrays
 
     # set the diagonal to 0
     np.fill_diagonal(tpm, 0.0)
@@ -88,7 +91,71 @@ def transfer_properties(rate_matrix, level_low, level_high):
     return [tpm, f_low_in, f_low_out, f_high_in, f_high_out, lambda_sum]
 
 
-def effective_rate(t, sp, level_low=0, level_high=1):
+def _sparse_transfer_properties(rate_matrix, level_low, level_high):
+    rate_matrix = rate_matrix.tocsr()
+
+    # indices of the levels kept in the reduced arrays
+    keep = _kept_levels(rate_matrix.shape[0], level_low, level_high)
+
+    lambda_sum = rate_matrix.diagonal()
+    lambda_red = lambda_sum[keep]
+
+    lambda_in = rate_matrix[[level_low, level_high], :].toarray()
+    lambda_out = rate_matrix[:, [level_low, level_high]].toarray()
+
+    f_low_in = lambda_in[0, keep] / lambda_red
+    f_high_in = lambda_in[1, keep] / lambda_red
+
+    f_low_out = lambda_out[keep, 0] / lambda_sum[level_low]
+    f_high_out = lambda_out[keep, 1] / lambda_sum[level_high]
+
+    # remove the rows and columns, transpose and divide the rows by the
+    # diagonal terms
+    tpm = rate_matrix[keep, :][:, keep].T
+    tpm = (diags(1.0 / lambda_red) @ tpm).tocsr()
+
+    # set the diagonal to 0
+    tpm.setdiag(0.0)
+    tpm.eliminate_zeros()
+
+    return [tpm, f_low_in, f_low_out, f_high_in, f_high_out, lambda_sum]
+
+
+def _kept_levels(n, level_low, level_high):
+    mask = np.ones(n, dtype=bool)
+    mask[[level_low, level_high]] = False
+    return np.flatnonzero(mask)
+
+
+def _factorize(tpm):
+    # Factorizes I - tpm.  The returned function solves
+    # (I - tpm) x = b, or (I - tpm)^T x = b if trans is set, for one or
+    # more right-hand sides.  The factorization is not cached, so it only
+    # serves the solves of one set of cascade vectors.
+    if issparse(tpm):
+        lu = splu((identity(tpm.shape[0], format="csc") - tpm).tocsc())
+        return lambda b, trans=False: lu.solve(b, trans="T" if trans else "N")
+
+    lu_piv = lu_factor(np.identity(len(tpm)) - tpm)
+    return lambda b, trans=False: lu_solve(lu_piv, b, trans=int(trans))
+
+
+def _cascade_vectors(trans_props, solve=None):
+    # Returns [g1_in, g2_in, g1_out, g2_out] for the transfer properties.
+    # The in vectors are forward solves and the out vectors transposed
+    # solves with the same factorization of I - tpm.
+    if solve is None:
+        solve = _factorize(trans_props[0])
+
+    g_in = solve(np.column_stack((trans_props[1], trans_props[3])))
+    g_out = solve(
+        np.column_stack((trans_props[2], trans_props[4])), trans=True
+    )
+
+    return [g_in[:, 0], g_in[:, 1], g_out[:, 0], g_out[:, 1]]
+
+
+def effective_rate(t, sp, level_low=0, level_high=1, sparse=False):
     """
     Method to calculate the effective transition rates between the isomeric and ground states
 
@@ -103,6 +170,9 @@ def effective_rate(t, sp, level_low=0, level_high=1):
         ``level_high`` (:obj:`int`, optional) The higher level the effective transtion rates are
         calculated to. Defaults to 1; the first excited state
 
+        ``sparse`` (:obj:`bool`, optional) If set to True, the calculation uses the sparse rate
+        matrix and a sparse factorization instead of dense matrices. Defaults to False.
+
     Returns:
         Upon successful return, the method returns the effective transition rates between the higher
         and lower level at temperature T
@@ -114,22 +184,21 @@ def effective_rate(t, sp, level_low=0, level_high=1):
         lower level
     """
 
-    rate_matrix = np.abs(sp.compute_rate_matrix(t))
+    rate_matrix = abs(sp.compute_rate_matrix(t, sparse=sparse))
     trans_props = transfer_properties(rate_matrix, level_low, level_high)
-    # f_n = _partial_sum(trans_props[0])
+    gammas = _cascade_vectors(trans_props)
 
-    f_n = np.linalg.inv(np.identity(len(trans_props[0])) - trans_props[0])
+    return _effective_rates(trans_props, gammas, level_low, level_high)
 
+
+def _effective_rates(trans_props, gammas, level_low, level_high):
     # Lambda_high_low_eff
     l_high_low = trans_props[5][level_high] * np.matmul(
-        trans_props[4].T, np.matmul(f_n, trans_props[1])
+        trans_props[4].T, gammas[0]
     )
     # Lambda_low_high_eff
-    l_low_high = trans_props[5][level_low] * (
-        np.matmul(
-            trans_props[2].T,
-            np.matmul(f_n, trans_props[3]),
-        )
+    l_low_high = trans_props[5][level_low] * np.matmul(
+        trans_props[2].T, gammas[1]
     )
 
     return (
@@ -155,7 +224,7 @@ def _partial_sum(tpm):
 """
 
 
-def cascade_probabilities(t, sp, level_low=0, level_high=1):
+def cascade_probabilities(t, sp, level_low=0, level_high=1, sparse=False):
     """
     Method to calculate the cascace probability vectores (gammas)
 
@@ -171,6 +240,9 @@ def cascade_probabilities(t, sp, level_low=0, level_high=1):
         ``level_high`` (:obj:`int`, optional) The higher level the effective transtion rates are
         calculated to. Defaults to 1; the first excited state
 
+        ``sparse`` (:obj:`bool`, optional) If set to True, the calculation uses the sparse rate
+        matrix and a sparse factorization instead of dense matrices. Defaults to False.
+
     Returns:
         Upon successful return, the cascade probability vectors will be returned as an array
 
@@ -180,23 +252,13 @@ def cascade_probabilities(t, sp, level_low=0, level_high=1):
         ``g2_in`` (:obj:`numpy.array`) cascade vector into higher level
     """
 
-    rate_matrix = np.abs(sp.compute_rate_matrix(t))
+    rate_matrix = abs(sp.compute_rate_matrix(t, sparse=sparse))
     trans_props = transfer_properties(rate_matrix, level_low, level_high)
 
-    # f_n = _partial_sum(trans_props[0])
-
-    f_n = np.linalg.inv(np.identity(len(trans_props[0])) - trans_props[0])
-
-    g1_in = np.matmul(f_n, trans_props[1])
-    g2_in = np.matmul(f_n, trans_props[3])
-
-    g1_out = np.matmul(f_n.T, trans_props[2])
-    g2_out = np.matmul(f_n.T, trans_props[4])
-
-    return [g1_in, g2_in, g1_out, g2_out]
+    return _cascade_vectors(trans_props)
 
 
-def ensemble_weights(t, sp, level_low=0, level_high=1):
+def ensemble_weights(t, sp, level_low=0, level_high=1, sparse=False):
     """
     Method to calculate the ensemble weights
 
@@ -212,6 +274,9 @@ def ensemble_weights(t, sp, level_low=0, level_high=1):
         ``level_high`` (:obj:`int`, optional) The higher level the effective transtion rates are
         calculated to. Defaults to 1; the first excited state
 
+        ``sparse`` (:obj:`bool`, optional) If set to True, the cascade probabilities are computed
+        with the sparse rate matrix. Defaults to False.
+
     Returns:
         Upon successful return, the ensemble weights and their properties will be returned
         as an array
@@ -229,38 +294,296 @@ def ensemble_weights(t, sp, level_low=0, level_high=1):
     # calculate the equilibrium probabilities
     eq_prob = sp.compute_equilibrium_probabilities(t)
 
-    n = len(eq_prob)
-    # initialize arrays
-    w_low, w_high, r_lowk, r_highk = (
-        np.empty(n),
-        np.empty(n),
-        np.empty(n - 2),
-        np.empty(n - 1),
-    )
-
     # get the cascade probabilities
     # gammas structure = [g1_in, g2_in, g1_out, g2_out]
-    gammas = cascade_probabilities(t, sp, level_low, level_high)
-
-    for i in range(n - 2):
-        r_lowk[i] = eq_prob[i + 2] / eq_prob[level_low]
-        r_highk[i] = eq_prob[i + 2] / eq_prob[level_high]
-
-    for i in range(n):
-        if i == level_low:
-            w_low[i] = 1.0
-            w_high[i] = 0.0
-        elif i == level_high:
-            w_low[i] = 0.0
-            w_high[i] = 1.0
-        else:
-            w_low[i] = gammas[0][i - 2] * r_lowk[i - 2]
-            w_high[i] = gammas[1][i - 2] * r_highk[i - 2]
-
-    w_low, w_high = np.sum(w_low), np.sum(w_high)
+    gammas = cascade_probabilities(t, sp, level_low, level_high, sparse)
+
+    return _ensemble_weights(sp, eq_prob, gammas, level_low, level_high)
+
+
+def _ensemble_weights(sp, eq_prob, gammas, level_low, level_high):
+    # the reverse ratios of the levels other than the low and high ones
+    kept = _kept_levels(len(eq_prob), level_low, level_high)
+    r_lowk = eq_prob[kept] / eq_prob[level_low]
+    r_highk = eq_prob[kept] / eq_prob[level_high]
+
+    w_low = 1.0 + np.sum(gammas[0] * r_lowk)
+    w_high = 1.0 + np.sum(gammas[1] * r_highk)
     # Calculate the partition functions
     levels = sp.get_levels()
     g_low = levels[level_low].get_multiplicity() * w_low
     g_high = levels[level_high].get_multiplicity() * w_high
 
     return [w_low, w_high, w_low, w_high, r_lowk, r_highk, g_low, g_high]
+
+
+def temperature_sweep(
+    temps, sp, level_low=0, level_high=1, sparse=False, max_workers=None
+):  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    """
+    Method to calculate the effective rates, cascade probabilities and ensemble weights
+    over an array of temperatures
+
+    Args:
+        ``temps`` (:obj:`numpy.array`) The temperatures in K.
+
+        ``sp`` (:obj:`lvlspy.species.Species`) The species of which the level system belongs to.
+
+        ``level_low`` (:obj:`int`, optional) The lower level the effective transition rates are
+        calculated to. Defaults to 0; the ground state.
+
+        ``level_high`` (:obj:`int`, optional) The higher level the effective transtion rates are
+        calculated to. Defaults to 1; the first excited state
+
+        ``sparse`` (:obj:`bool`, optional) If set to True, the calculation uses the sparse rate
+        matrix and a sparse factorization instead of dense matrices. Defaults to False.
+
+        ``max_workers`` (:obj:`int`, optional) The number of worker processes the temperatures
+        are distributed over. The species is serialized once per worker. Defaults to None, in
+        which case the number of processors on the machine is used. If set to 1, the sweep is
+        run in the calling process.
+
+    Returns:
+        Upon successful return, the method returns a :obj:`dict` of arrays stacked along the
+        temperature axis, with keys
+
+        ``l_low_high`` and ``l_high_low`` (:obj:`numpy.array`) The effective transition rates,
+        as returned by :meth:`effective_rate`.
+
+        ``g1_in``, ``g2_in``, ``g1_out`` and ``g2_out`` (:obj:`numpy.array`) 2D arrays of the
+        cascade probability vectors, as returned by :meth:`cascade_probabilities`.
+
+        ``w_low``, ``w_high``, ``r_lowk``, ``r_highk``, ``g_low`` and ``g_high``
+        (:obj:`numpy.array`) The ensemble weights and their properties, as returned by
+        :meth:`ensemble_weights`.
+    """
+
+    temps = np.atleast_1d(np.asarray(temps, dtype=float))
+    args = (level_low, level_high, sparse)
+
+    if max_workers == 1:
+        results = [_isomer_properties(t, sp, *args) for t in temps]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_sweep_worker,
+            initargs=(pickle.dumps(sp),),
+        ) as executor:
+            n_workers = max_workers or os.cpu_count() or 1
+            results = list(
+                executor.map(
+                    _sweep_worker,
+                    temps,
+                    [args] * len(temps),
+                    chunksize=max(1, len(temps) // (4 * n_workers)),
+                )
+            )
+
+    keys = [
+        "l_low_high",
+        "l_high_low",
+        "g1_in",
+        "g2_in",
+        "g1_out",
+        "g2_out",
+        "w_low",
+        "w_high",
+        "r_lowk",
+        "r_highk",
+        "g_low",
+        "g_high",
+    ]
+
+    return {
+        key: np.stack([result[i] for result in results])
+        for i, key in enumerate(keys)
+    }
+
+
+def _isomer_properties(t, sp, level_low, level_high, sparse):
+    # Computes the rate matrix and its cascade vectors once and derives all the
+    # properties of the sweep from them.
+    rate_matrix = abs(sp.compute_rate_matrix(t, sparse=sparse))
+    trans_props = transfer_properties(rate_matrix, level_low, level_high)
+    gammas = _cascade_vectors(trans_props)
+
+    weights = _ensemble_weights(
+        sp,
+        sp.compute_equilibrium_probabilities(t),
+        gammas,
+        level_low,
+        level_high,
+    )
+
+    return (
+        list(_effective_rates(trans_props, gammas, level_low, level_high))
+        + gammas
+        + [weights[0], weights[1]]
+        + weights[4:]
+    )
+
+
+_SWEEP_SPECIES = None
+
+
+def _init_sweep_worker(species_bytes):
+    global _SWEEP_SPECIES  # pylint: disable=global-statement
+    _SWEEP_SPECIES = pickle.loads(species_bytes)
+
+
+def _sweep_worker(t, args):
+    return _isomer_properties(t, _SWEEP_SPECIES, *args)
+
+
+def multi_pair_rates(t, sp, pairs, sparse=False):
+    """
+    Method to calculate the effective transition rates and cascade probability vectors
+    between several pairs of levels at once
+
+    Args:
+        ``t`` (:obj:`float`) The temperature in K.
+
+        ``sp`` (:obj:`lvlspy.species.Species`) The species of which the level system belongs to.
+
+        ``pairs`` (:obj:`list`) A list of (``level_low``, ``level_high``) tuples of level
+        indices.  To treat a set of ensemble anchor levels, pass all the pairs of anchors,
+        for example with :obj:`itertools.combinations`.
+
+        ``sparse`` (:obj:`bool`, optional) If set to True, the calculation uses the sparse rate
+        matrix and a sparse factorization instead of dense matrices. Defaults to False.
+
+    Returns:
+        Upon successful return, the method returns two lists with one entry per pair, in the
+        order of ``pairs``
+
+        ``rates`` (:obj:`list`) The (``l_low_high``, ``l_high_low``) effective transition rates,
+        as returned by :meth:`effective_rate`.
+
+        ``gammas`` (:obj:`list`) The [``g1_in``, ``g2_in``, ``g1_out``, ``g2_out``] cascade
+        probability vectors, as returned by :meth:`cascade_probabilities`.
+
+    """
+
+    # pylint: disable=too-many-locals
+    rate_matrix = abs(sp.compute_rate_matrix(t, sparse=sparse))
+    if issparse(rate_matrix):
+        rate_matrix = rate_matrix.tocsr()
+
+    lambda_sum = rate_matrix.diagonal()
+    shared = _anchor_factorization(rate_matrix, lambda_sum, np.ravel(pairs))
+
+    # the rates into and out of the levels of all the pairs, and the
+    # corresponding solutions on the free levels
+    pair_levels = np.ravel(pairs)
+    f_in = _as_dense(rate_matrix[pair_levels, :]).T / lambda_sum[:, None]
+    lambda_out = _as_dense(rate_matrix[:, pair_levels])
+
+    y_in = shared["solve"](f_in[shared["free"]])
+    y_out = shared["solve"](lambda_out[shared["free"]], trans=True)
+
+    rates, gammas = [], []
+    for i, pair in enumerate(pairs):
+        cols = [2 * i, 2 * i + 1]
+        keep, g_in, g_out = _pair_cascade_vectors(
+            shared,
+            pair,
+            (f_in[:, cols], y_in[:, cols]),
+            (lambda_out[:, cols], y_out[:, cols]),
+        )
+
+        # the out vectors are solved with the rates, and are divided by
+        # the diagonal terms of the pair levels here
+        g_out /= lambda_sum[pair_levels[cols]]
+
+        gammas.append([g_in[:, 0], g_in[:, 1], g_out[:, 0], g_out[:, 1]])
+        rates.append(
+            (
+                np.dot(lambda_out[keep, 2 * i], g_in[:, 1]),
+                np.dot(lambda_out[keep, 2 * i + 1], g_in[:, 0]),
+            )
+        )
+
+    return rates, gammas
+
+
+def _anchor_factorization(rate_matrix, lambda_sum, levels):
+    # The levels that are not in any pair are kept in every reduced system,
+    # so I - tpm is factorized once on them.  The reduced system of a pair
+    # adds the rows and columns of the other anchor levels, which is solved
+    # with their Schur complement.
+    anchors = np.unique(levels)
+    free = np.setdiff1d(np.arange(rate_matrix.shape[0]), anchors)
+
+    solve = _factorize(_tpm_block(rate_matrix, lambda_sum, free, free))
+    p_fa = _as_dense(_tpm_block(rate_matrix, lambda_sum, free, anchors))
+    p_af = _as_dense(_tpm_block(rate_matrix, lambda_sum, anchors, free))
+    p_aa = _as_dense(_tpm_block(rate_matrix, lambda_sum, anchors, anchors))
+
+    z_fa = solve(p_fa)
+
+    return {
+        "anchors": anchors,
+        "free": free,
+        "solve": solve,
+        "p_fa": p_fa,
+        "p_af": p_af,
+        "z_fa": z_fa,
+        "z_af": solve(p_af.T, trans=True),
+        "schur": np.identity(len(anchors)) - p_aa - p_af @ z_fa,
+    }
+
+
+def _pair_cascade_vectors(shared, pair, rhs_in, rhs_out):
+    # Returns the kept levels of the pair and the forward and transposed
+    # solutions on them, from the right-hand sides on all the levels and
+    # their solutions on the free levels.
+    anchors = shared["anchors"]
+    e = np.flatnonzero((anchors != pair[0]) & (anchors != pair[1]))
+    schur = shared["schur"][np.ix_(e, e)]
+
+    x_in = _bordered_solution(
+        rhs_in[1],
+        shared["z_fa"][:, e],
+        schur,
+        rhs_in[0][anchors[e]] + shared["p_af"][e] @ rhs_in[1],
+    )
+    x_out = _bordered_solution(
+        rhs_out[1],
+        shared["z_af"][:, e],
+        schur.T,
+        rhs_out[0][anchors[e]] + shared["p_fa"][:, e].T @ rhs_out[1],
+    )
+
+    keep = np.concatenate((shared["free"], anchors[e]))
+    order = np.argsort(keep)
+
+    return keep[order], x_in[order], x_out[order]
+
+
+def _bordered_solution(y, z, schur, rhs):
+    # Completes the solutions y on the free levels with the anchor levels of
+    # the Schur complement, stacked after them.
+    x = np.linalg.solve(schur, rhs)
+    return np.concatenate((y + z @ x, x))
+
+
+def _as_dense(matrix):
+    return matrix.toarray() if issparse(matrix) else np.asarray(matrix)
+
+
+def _tpm_block(rate_matrix, lambda_sum, rows, cols):
+    # Returns the rows and columns of the Transition Probability Matrix of
+    # the full level system, for sorted arrays of level indices.
+    if issparse(rate_matrix):
+        block = rate_matrix[cols, :][:, rows].T
+        block = (diags(1.0 / lambda_sum[rows]) @ block).tolil()
+    else:
+        block = rate_matrix[np.ix_(cols, rows)]
+        block /= lambda_sum[rows]
+        block = block.T
+
+    # set the diagonal of the full matrix to 0
+    _, i_rows, i_cols = np.intersect1d(rows, cols, return_indices=True)
+    block[i_rows, i_cols] = 0.0
+
+    return block.tocsr() if issparse(block) else block
@@ -6,12 +6,47 @@ import numpy as np
 import scipy.special as spc
 from gslconsts.consts import GSL_CONST_NUM_ZETTA
 
+_J_MAX = 40
+
 
 class Weisskopf:
     """
     A class for handling Weisskopf related calculations
+
+    Args:
+        ``a`` (:obj:`int`, optional) A mass number.  If supplied, the prefactors of the
+        rates are tabulated once for all the gamma angular momenta up to 40, and are
+        looked up whenever a rate is calculated for this mass number.  Defaults to None.
     """
 
+    def __init__(self, a=None):
+        self._a = a
+        self._table = None
+        if a is not None:
+            j = np.arange(1, _J_MAX + 1)
+            self._table = _prefactors(j, a)
+            self._table["b_sp_el"] = (
+                np.power(3.0 / (3.0 + j), 2)
+                * np.power(1.2 * np.power(a, 1 / 3), 2 * j)
+                / (4 * np.pi)
+            )
+            self._table["b_sp_ml"] = (
+                10.0
+                * np.power(3.0 / (j + 3.0), 2)
+                * np.power(1.2 * a ** (1 / 3), 2 * j - 2)
+                / np.pi
+            )
+
+    def _lookup(self, key, j, a):
+        # Returns the tabulated prefactor, or None if it is not tabulated.
+        # The tables are computed in the same order of operations as the
+        # formulas, so that both give identical results.
+        if self._table is None or a != self._a or j != int(j):
+            return None
+        if not 1 <= j <= _J_MAX:
+            return None
+        return self._table[key][int(j) - 1]
+
     def rate_mag(self, e_i, e_f, j, a):
         """
         Calculates the transition rate between two levels where
@@ -33,6 +68,15 @@ class Weisskopf:
 
         de = e_i - e_f
 
+        s = self._lookup("s_mag", j, a)
+        if s is not None:
+            return (
+                s
+                * np.power(de / 197000.0, 2 * j + 1)
+                * self._lookup("r_mag", j, a)
+                * GSL_CONST_NUM_ZETTA
+            )
+
         s = (
             1.9 * (j + 1) / (j * np.power(spc.factorial2(2 * j + 1), 2))
         ) * np.power(3 / (j + 3), 2)
@@ -64,6 +108,15 @@ class Weisskopf:
 
         de = e_i - e_f  # energy difference
 
+        s = self._lookup("s_elec", j, a)
+        if s is not None:
+            return (
+                s
+                * np.power(de / 197000.0, 2 * j + 1)
+                * self._lookup("r_elec", j, a)
+                * GSL_CONST_NUM_ZETTA
+            )
+
         s = (
             4.4 * (j + 1) / (j * np.power(spc.factorial2(2 * j + 1), 2))
         ) * np.power(3 / (j + 3), 2)
@@ -102,6 +155,56 @@ class Weisskopf:
 
         return ein_a
 
+    def estimate_array(self, e, j, p, a):
+        """Calculates the Weisskopf estimates for arrays of transitions between two states.
+
+        Args:
+            ``e`` (:obj:`list`) A list containing the arrays of the energies of the initial
+            and of the final levels
+
+            ``j`` (:obj:`list`) A list containing the arrays of the angular momenta of the
+            initial and of the final levels
+
+            ``p`` (:obj:`list`) A list containing the arrays of the parities, as +1 or -1,
+            of the initial and of the final levels
+
+            ``a`` (:obj:`int` or :obj:`numpy.array`) The mass number of the species, or an
+            array of mass numbers of the transitions
+
+        Returns:
+            ``ein_a`` (:obj:`numpy.array`) The Einstein A coefficients of the downwards
+            transitions, summed over the same gamma angular momenta as in :meth:`estimate`
+        """
+        e_i, e_f, j_i, j_f, p_i, p_f, a = (
+            x[..., np.newaxis]
+            for x in np.broadcast_arrays(
+                *(np.asarray(x, dtype=float) for x in (*e, *j, *p, a))
+            )
+        )
+
+        jj, in_range = _multipole_range(j_i, j_f)
+        table = self._get_prefactors(jj, a)
+        elec = np.where(jj % 2 == 0, 1, -1) * p_i == p_f
+
+        # Weisskopf estimates in generally over-estimate by a factor of 10
+        return _sum_multipoles(
+            np.where(elec, table["s_elec"], table["s_mag"])
+            * np.power((e_i - e_f) / 197000.0, 2 * jj + 1)
+            * np.where(elec, table["r_elec"], table["r_mag"])
+            * GSL_CONST_NUM_ZETTA
+            / 10,
+            in_range,
+        )
+
+    def _get_prefactors(self, j, a):
+        if (
+            self._table is not None
+            and np.all(a == self._a)
+            and len(j) <= _J_MAX
+        ):
+            return {key: value[: len(j)] for key, value in self._table.items()}
+        return _prefactors(j, a)
+
     def estimate_from_ensdf(self, t, a):
         """
         Calculates the Weisskopf estimate for a transition between two states based on the
@@ -254,6 +357,10 @@ class Weisskopf:
         return reduced_prob
 
     def _b_sp_ml(self, a, j):
+        b_sp = self._lookup("b_sp_ml", j, a)
+        if b_sp is not None:
+            return b_sp
+
         return (
             10.0
             * np.power(3.0 / (j + 3.0), 2)
@@ -262,8 +369,48 @@ class Weisskopf:
         )
 
     def _b_sp_el(self, a, j):
+        b_sp = self._lookup("b_sp_el", j, a)
+        if b_sp is not None:
+            return b_sp
+
         return (
             np.power(3.0 / (3.0 + j), 2)
             * np.power(1.2 * np.power(a, 1 / 3), 2 * j)
             / (4 * np.pi)
         )
+
+
+def _multipole_range(j_i, j_f):
+    # Returns the gamma angular momenta up to the largest one of the
+    # transitions, and the mask of those in the range of each transition.
+    j_low = np.floor(np.maximum(1, np.abs(j_i - j_f)))
+    j_high = np.floor(j_i + j_f + 1) - 1
+
+    jj = np.arange(1, max(np.max(j_high, initial=0), 0) + 1, dtype=int)
+
+    return jj, (jj >= j_low) & (jj <= j_high)
+
+
+def _sum_multipoles(rates, in_range):
+    # Sums the rates in increasing multipolarity, as in Weisskopf.estimate.
+    ein_a = np.zeros(rates.shape[:-1])
+    for k in range(rates.shape[-1]):
+        ein_a += np.where(in_range[..., k], rates[..., k], 0.0)
+    return ein_a
+
+
+def _prefactors(j, a):
+    # Returns the factors of the electric and magnetic rates that do not
+    # depend on the energy, for arrays of gamma angular momenta.
+    # scipy evaluates (2j+1)!! differently for scalars and arrays, so it is
+    # evaluated for each j as in the single-rate methods
+    f = j * np.power([spc.factorial2(2 * k + 1) for k in j], 2)
+    g = np.power(3 / (j + 3), 2)
+    r = 1.2 * np.power(a, 1.0 / 3.0)
+
+    return {
+        "s_elec": (4.4 * (j + 1) / f) * g,
+        "s_mag": (1.9 * (j + 1) / f) * g,
+        "r_elec": np.power(r, 2 * j),
+        "r_mag": np.power(r, 2 * j - 2),
+    }
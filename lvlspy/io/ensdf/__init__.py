@@ -4,3 +4,5 @@ A submodule to handle input and output of data in ENSDF format.
 
 import os
 from ._ensdf import *
+from ._index import *
+from ._bulk import *
@@ -0,0 +1,114 @@
+"""
+Module to read all the nuclides of ENSDF files
+"""
+
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import lvlspy.spcoll as lc
+
+from ._ensdf import (
+    _build_species,
+    _get_file_sp_and_identifiers,
+    _parse_level_and_transition_data,
+)
+from ._index import _get_species_name
+
+__all__ = ["load_ensdf_files"]
+
+
+def load_ensdf_files(files, max_workers=None, tol=1.0):
+    """Method to read all the species in a set of ENSDF files.
+
+    Args:
+        ``files`` (:obj:`list`) The names of the ENSDF files.
+
+        ``max_workers`` (:obj:`int`, optional) The number of worker processes the
+        files are distributed over.  Defaults to None, in which case the number of
+        processors on the machine is used.  If set to 1, the files are read in the
+        calling process.
+
+        ``tol`` (:obj:`float`, optional): The tolerance, in keV, of the matching of
+        the final levels of the gammas, as in :meth:`update_from_ensdf`.  Defaults
+        to 1.
+
+    Returns:
+        ``coll`` (:obj:`lvlspy.spcoll.SpColl`) A species collection with all the
+        species read.  As for :meth:`update_from_ensdf`, the levels and gammas of a
+        species are those of the first dataset of the file with its level records.
+
+        ``report`` (:obj:`dict`) A dictionary keyed on the file names.  Each entry is
+        a dictionary with the ``time`` in seconds spent on the file, the list of the
+        names of the ``species`` read from it, and a dictionary of ``failures`` giving
+        the error message for each species, or for the file itself, that could not be
+        read.
+
+    """
+
+    if max_workers == 1:
+        results = [_load_ensdf_file(file, tol) for file in files]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(
+                executor.map(_load_ensdf_file, files, [tol] * len(files))
+            )
+
+    coll = lc.SpColl()
+    report = {}
+    for file, (species, entry) in zip(files, results):
+        for s in species:
+            coll.add_species(s)
+        report[file] = entry
+
+    return coll, report
+
+
+def _load_ensdf_file(file, tol):
+    start = time.perf_counter()
+    species = []
+    failures = {}
+
+    try:
+        with open(file, "r", encoding="utf-8") as f:
+            nuclides = _split_ensdf_nuclides(f.readlines())
+    except (OSError, UnicodeDecodeError) as e:
+        failures[file] = str(e)
+        nuclides = {}
+
+    for nucid, lines in nuclides.items():
+        sp = _get_species_name(nucid)
+        try:
+            match = re.search(r"\d+", sp)
+            a = int(match.group())
+            levels, transitions = _parse_level_and_transition_data(
+                lines, _get_file_sp_and_identifiers(match, sp, a), tol
+            )
+            species.append(_build_species(sp, a, levels, transitions))
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            failures[sp] = f"{type(e).__name__}: {e}"
+
+    return species, {
+        "time": time.perf_counter() - start,
+        "species": [s.get_name() for s in species],
+        "failures": failures,
+    }
+
+
+def _split_ensdf_nuclides(lines):
+    # Splits the lines of an ENSDF file into datasets, which end with a blank
+    # record, and keeps the first dataset with level records of each nuclide,
+    # as update_from_ensdf does.
+    datasets = [[]]
+    for line in lines:
+        if line.strip() == "":
+            datasets.append([])
+        else:
+            datasets[-1].append(line)
+
+    nuclides = {}
+    for dataset in datasets:
+        if any(line[5:8] == "  L" for line in dataset):
+            nuclides.setdefault(dataset[0][:5], dataset)
+
+    return nuclides
@@ -3,7 +3,11 @@ Module to handle ENSDF input and output
 """
 
 import re
-import math
+from bisect import bisect_left, insort
+from functools import lru_cache
+from itertools import islice
+
+import numpy as np
 
 import lvlspy.level as lv
 import lvlspy.species as ls
@@ -11,8 +15,87 @@ import lvlspy.properties as lp
 import lvlspy.transition as lt
 import lvlspy.calculate as calc
 
-
-def update_from_ensdf(coll, file, sp):
+from ._index import _read_ensdf_block
+
+__all__ = [
+    "update_from_ensdf",
+    "update_reduced_matrix_coefficient",
+    "write_to_ensdf",
+    "fill_missing_ensdf_transitions",
+    "remove_undefined_levels",
+]
+
+_CARD_WIDTH = 80  # width of an ENSDF card image
+_CHUNK_SIZE = 8192  # number of lines tokenized at a time
+
+# (name, first column, end column) of the fields of the level and gamma
+# records, in the order the fields are stored
+_LEVEL_COLUMNS = [
+    ("energy", 9, 19),
+    ("energy uncertainty", 19, 21),
+    ("j^pi", 21, 39),
+    ("isomer state", 77, 79),
+    ("half life", 39, 49),
+    ("half life uncertainty", 49, 55),
+    ("angular momentum transfer", 55, 64),
+    ("spectroscopic strength", 64, 74),
+    ("spectroscopic strength uncertainty", 74, 76),
+    ("Comment flag", 76, 77),
+    ("questionable character", 79, 80),
+]
+
+_GAMMA_COLUMNS = [
+    ("E_gamma", 9, 19),
+    ("Delta_E", 19, 21),
+    ("Relative_Total_Intensity", 21, 29),
+    ("Relative_Total_Intensity_Uncertainty", 29, 31),
+    ("Transition_Multipolarity", 31, 41),
+    ("Mixing_Ratio", 41, 49),
+    ("Mixing_Ratio_Uncertainty", 49, 55),
+    ("Total_Conversion_Coefficient", 55, 62),
+    ("Total_Conversion_Coefficient_Uncertainty", 62, 64),
+    ("Relative_Total_Transition_Intensity", 64, 74),
+    ("Relative_Total_Transition_Intensity_Uncertainty", 74, 76),
+    ("Comment", 76, 77),
+    ("Coincidence", 77, 78),
+    ("Question", 79, 80),
+]
+
+_WRITE_CHUNK = 8192  # number of lines written at a time
+
+# columns of the properties written on the level and gamma lines
+_LEVEL_LINE = {
+    "energy_uncertainty": [19, 21],
+    "j^pi": [21, 39],
+    "half life": [39, 49],
+    "half life uncertainty": [49, 55],
+    "angular momentum transfer": [55, 64],
+    "spectroscopic strength": [64, 74],
+    "spectroscopic strength uncertainty": [74, 76],
+    "Comment flag": [76],
+    "isomer state": [77, 79],
+    "questionable character": [79],
+}
+
+_GAMMA_LINE = {
+    "E_gamma": [9, 19],
+    "Delta_E": [19, 21],
+    "Relative_Total_Intensity": [21, 29],
+    "Relative_Total_Intensity_Uncertainty": [29, 31],
+    "Transition_Multipolarity": [31, 41],
+    "Mixing_Ratio": [41, 49],
+    "Mixing_Ratio_Uncertainty": [49, 55],
+    "Total_Conversion_Coefficient": [55, 62],
+    "Total_Conversion_Coefficient_Uncertainty": [62, 64],
+    "Relative_Total_Transition_Intensity": [64, 74],
+    "Relative_Total_Transition_Intensity_Uncertainty": [74, 76],
+    "Comment": [76],
+    "Coincidence": [77],
+    "Question": [79],
+}
+
+
+def update_from_ensdf(coll, file, sp, use_index=False, tol=1.0):
     """Method to update a species collection from an ENSDF file.
 
     Args:
@@ -22,13 +105,24 @@ def update_from_ensdf(coll, file, sp):
 
         ``sp`` (:obj:`str`): The species to be read from file.
 
+        ``use_index`` (:obj:`bool`, optional): If set to True, only the block of
+        the file with the levels of the species is read, as located by the index
+        of :meth:`build_ensdf_index`.  The index is built and saved if it is
+        missing or older than the file.  Defaults to False.
+
+        ``tol`` (:obj:`float`, optional): The tolerance, in keV, within which the
+        energy of the final level of a gamma must match the energy of the initial
+        level minus the gamma energy.  The closest level is chosen.  Defaults to 1.
+
 
     Returns:
-        On successful return, the species collection has been updated.
+        On successful return, the species collection has been updated with the
+        levels and gammas of the first dataset of the file with level records of
+        the species, normally its adopted levels.
 
     """
 
-    _get_species_from_ensdf(coll, file, sp)
+    _get_species_from_ensdf(coll, file, sp, use_index, tol)
 
 
 def _set_level_properties(levels):
@@ -47,33 +141,42 @@ def _set_level_properties(levels):
         "useability",
     ]
     levs = []
-    for i, l in enumerate(levels):  # setting the level with properties
+    for l in levels:  # setting the level with properties
 
-        levs.append(lv.Level(l[0], l[1]))
-        additional_properties = [
-            {key: value} for key, value in zip(properties, l[2:-1])
-        ]
-        additional_properties.append({properties[-1]: l[-1]})
-
-        for j in additional_properties:
-            levs[i].update_properties(j)
+        lev = lv.Level(l[0], l[1])
+        additional_properties = dict(zip(properties, l[2:-1]))
+        additional_properties[properties[-1]] = l[-1]
+        lev.update_properties(additional_properties)
+        levs.append(lev)
 
     return levs
 
 
-def _get_species_from_ensdf(coll, file, sp):
+def _get_species_from_ensdf(coll, file, sp, use_index=False, tol=1.0):
     match = re.search(r"\d+", sp)
     a = int(match.group())  # mass number
 
     identifiers = _get_file_sp_and_identifiers(match, sp, a)
 
-    levels, transitions = _get_level_and_transition_data(file, identifiers)
+    if use_index:
+        levels, transitions = _parse_level_and_transition_data(
+            _read_ensdf_block(file, sp), identifiers, tol
+        )
+    else:
+        levels, transitions = _get_level_and_transition_data(
+            file, identifiers, tol
+        )
+
+    coll.add_species(_build_species(sp, a, levels, transitions))
 
+
+def _build_species(sp, a, levels, transitions):
     # setting the levels and transitions in lvlspy format
     levs = _set_level_properties(levels)
     s = ls.Species(sp, levels=levs)
 
     lvs = s.get_levels()
+    weisskopf = calc.Weisskopf(a)
 
     for tran in enumerate(transitions):
         if tran[1][1] == -1:
@@ -87,11 +190,11 @@ def _get_species_from_ensdf(coll, file, sp):
 
         t = lt.Transition(lvs[tran[1][0]], lvs[tran[1][1]], 0.0)
         t = _set_transition_properties(t, tran[1])
-        ein_a = calc.Weisskopf().estimate_from_ensdf(t, a)
+        ein_a = weisskopf.estimate_from_ensdf(t, a)
         t.update_einstein_a(ein_a)
         s.add_transition(t)
 
-    coll.add_species(s)
+    return s
 
 
 def _set_transition_properties(t, tran):
@@ -112,12 +215,9 @@ def _set_transition_properties(t, tran):
         "Question",
         "Reduced_Matrix_Coefficient",
     ]
-    add_properties = [
-        {key: value} for key, value in zip(properties, tran[2:-1])
-    ]
-    add_properties.append({properties[-1]: tran[-1]})
-    for j in add_properties:
-        t.update_properties(j)
+    add_properties = dict(zip(properties, tran[2:-1]))
+    add_properties[properties[-1]] = tran[-1]
+    t.update_properties(add_properties)
     if t.get_properties()["Reduced_Matrix_Coefficient"] != "":
         _extract_rmc(t)
     return t
@@ -182,65 +282,104 @@ def update_reduced_matrix_coefficient(sp, a, t, rmc, mr=0):
     return t
 
 
-def _get_additional_level_properties(line):
-    delta_e = line[19:21].strip()  # energy uncertainty
-    jpi = line[21:39].strip()  # strip the spaces
-    iso = line[77:79].strip()  # isomer indicator
-    t_half = line[39:49].strip()  # level half life
-    delta_t_half = line[49:55].strip()  # half life uncertainty
-    l = line[55:64].strip()  # Angular momentum transfer
-    s = line[64:74].strip()  # spectroscopic strength
-    delta_s = line[74:76].strip()  # uncertainty in S
-    comment = line[76]  # comment flag
-    q = line[79]  # questionable level
-    return [
-        delta_e,
-        jpi,
-        iso,
-        t_half,
-        delta_t_half,
-        l,
-        s,
-        delta_s,
-        comment,
-        q,
+def _tokenize_ensdf(lines, identifiers, chunk_size=_CHUNK_SIZE):
+    # Yields the level ("L"), gamma ("G") and reduced transition probability
+    # ("B") records of a nuclide and the blank ("E") records ending the
+    # datasets of the file in the order they appear.  The lines are
+    # read in chunks and laid out as a fixed-width byte array, so that the
+    # records are selected and their columns extracted array-wise.  The
+    # level and gamma records are tuples of the fields in _LEVEL_COLUMNS and
+    # _GAMMA_COLUMNS, the B records are the raw lines.
+    lines = iter(lines)
+    layouts = [
+        ("L", _LEVEL_COLUMNS, _get_card_dtype(_LEVEL_COLUMNS)),
+        ("G", _GAMMA_COLUMNS, _get_card_dtype(_GAMMA_COLUMNS)),
     ]
 
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield from _tokenize_chunk(chunk, identifiers, layouts)
+
+
+def _tokenize_chunk(chunk, identifiers, layouts):
+    data = _get_card_images(chunk)
+    cards = np.frombuffer(data, dtype=np.uint8).reshape(-1, _CARD_WIDTH)
+
+    # 1 for level, 2 for gamma, 3 for B, and 4 for blank records, 0 for
+    # the rest
+    kinds = np.zeros(len(chunk), dtype=np.int8)
+    kinds[np.all(cards == ord(" "), axis=1)] = 4
+    for kind, identifier in enumerate(identifiers, start=1):
+        kinds[_match_cards(cards, identifier)] = kind
+
+    records = {}
+    for kind, (card, columns, dtype) in enumerate(layouts, start=1):
+        rows = kinds == kind
+        fields = _get_card_fields(
+            np.frombuffer(data, dtype=dtype)[rows], columns
+        )
+        records.update(
+            (i, (card, f))
+            for i, f in zip(np.flatnonzero(rows).tolist(), fields)
+        )
+    for i in np.flatnonzero(kinds == 3).tolist():
+        records[i] = ("B", chunk[i])
+    for i in np.flatnonzero(kinds == 4).tolist():
+        records[i] = ("E", None)
+
+    return [records[i] for i in np.flatnonzero(kinds).tolist()]
+
+
+def _get_card_images(chunk):
+    # The lines as contiguous 80-column card images, blank padded.  Lines
+    # with non-ASCII characters, which only occur in comments, are encoded
+    # one by one with a placeholder character to keep the columns aligned.
+    try:
+        cards = np.array(chunk, dtype=f"S{_CARD_WIDTH}")
+    except UnicodeEncodeError:
+        return "".join(
+            line.rstrip("\r\n")[:_CARD_WIDTH].ljust(_CARD_WIDTH)
+            for line in chunk
+        ).encode("ascii", "replace")
+    cards = cards.view(np.uint8).reshape(-1, _CARD_WIDTH)
+    cards[np.isin(cards, (0, 10, 13))] = 32
+    return cards.tobytes()
+
+
+def _get_card_dtype(columns):
+    # A structured dtype viewing the fields of an 80-column card image.
+    return np.dtype(
+        {
+            "names": [name for name, _, _ in columns],
+            "formats": [f"S{end - start}" for _, start, end in columns],
+            "offsets": [start for _, start, _ in columns],
+            "itemsize": _CARD_WIDTH,
+        }
+    )
 
-def _get_additional_gamma_properties(line):
-    delta_energy = line[19:21].strip()  # gamma energy uncertainty
-    ri = line[21:29].strip()  # relative photon intensity
-    dri = line[29:31].strip()  # uncertainty in RI
-    m = line[31:41].strip()  # multipolarity of transition
-    mr = line[41:49].strip()  # mixing ratio
-    dmr = line[49:55].strip()  # uncertainty in MR
-    cc = line[55:62].strip()  # Total conversion coefficient
-    dcc = line[62:64].strip()  # uncertainty in CC
-    ti = line[64:74].strip()  # relative total intensity
-    dti = line[74:76].strip()  # uncertainty in TI
-    c = line[76]  # comment flag
-    coin = line[77]  # coincidence flag
-    q = line[79]  # questions transition existance
 
-    return [
-        delta_energy,
-        ri,
-        dri,
-        m,
-        mr,
-        dmr,
-        cc,
-        dcc,
-        ti,
-        dti,
-        c,
-        coin,
-        q,
-    ]
+def _match_cards(cards, identifier):
+    # The rows of the card array that start with the identifier.
+    prefix = np.frombuffer(identifier.encode("ascii"), dtype=np.uint8)
+    return np.all(cards[:, : len(prefix)] == prefix, axis=1)
+
 
+def _get_card_fields(records, columns):
+    # Iterates over the records as tuples of strings.  Fields wider than one
+    # column are stripped, single-column flags are kept as they are.
+    fields = []
+    for name, start, end in columns:
+        column = records[name]
+        if end - start > 1:
+            column = np.char.strip(column)
+        fields.append(column.astype(str).tolist())
+    return zip(*fields)
 
-def _read_levels(line, a, zero_counter):
-    energy = line[9:19].strip()
+
+def _read_levels(fields, a, zero_counter):
+    energy = fields[0]
     temp = []
     if energy[0] in a:
         str_dummy = energy[0] + "+"
@@ -255,23 +394,16 @@ def _read_levels(line, a, zero_counter):
     if zero_counter == 2:
         return temp, zero_counter
 
-    properties = _get_additional_level_properties(line)
+    properties = fields[1:]
     multi, parity, useable = _extract_multi_parity(properties[1])
 
-    temp = [
-        energy,
-        multi,
-        parity,
-    ]  # temporary dummy array for re-use
-    for prop in enumerate(properties):
-        temp.append(prop[1])
-    temp.append(useable)
+    temp = [energy, multi, parity, *properties, useable]
 
     return temp, zero_counter
 
 
-def _read_transition(line, a, lvls):
-    e_g = line[9:19].strip()  # gamma ray energy
+def _read_transition(fields, a, lvls, sorted_lvls, tol):
+    e_g = fields[0]  # gamma ray energy
 
     if e_g[0] in a:
         str_dummy = e_g[0] + "+"
@@ -284,58 +416,84 @@ def _read_transition(line, a, lvls):
         e_g = str(0)
 
     e_g = float(e_g)
-    index = -1
-    for i, lev in enumerate(lvls):
-
-        if math.isclose(
-            abs(e_g - (lvls[-1][0] - lev[0])),
-            0.0,
-            abs_tol=1.0,
+    index = -1  # gammas before the first level are not placed
+    if lvls:
+        index = _match_level(sorted_lvls, lvls[-1][0] - e_g, tol)
+
+    return [len(lvls) - 1, index, e_g, *fields[1:], ""]
+
+
+def _match_level(sorted_lvls, energy, tol):
+    # Returns the index of the level closest in energy to the input energy
+    # within the tolerance, or -1.  sorted_lvls holds the (energy, index) of
+    # the levels sorted by energy, so the closest levels are found by bisection
+    # and ties go to the level read first.
+    i = bisect_left(sorted_lvls, (energy, -1))
+    candidates = []
+    if i < len(sorted_lvls):
+        candidates.append(sorted_lvls[i])
+    if i > 0:
+        # the first level read with the energy of the lower neighbor
+        candidates.append(
+            sorted_lvls[bisect_left(sorted_lvls, (sorted_lvls[i - 1][0], -1))]
+        )
+
+    best, best_diff = -1, tol
+    for lev_energy, index in candidates:
+        diff = abs(lev_energy - energy)
+        if diff < best_diff or (
+            diff == best_diff and (best == -1 or index < best)
         ):
-            index = i
-            break
+            best, best_diff = index, diff
+
+    return best
+
 
-    temp = [len(lvls) - 1, index, e_g]
-    properties = _get_additional_gamma_properties(line)
-    for prop in enumerate(properties):
-        temp.append(prop[1])
-    temp.append("")
-    return temp
+def _get_level_and_transition_data(file, identifiers, tol=1.0):
+
+    with open(file, "r", encoding="utf-8") as f:
+        return _parse_level_and_transition_data(f, identifiers, tol)
 
 
-def _get_level_and_transition_data(file, identifiers):
+def _parse_level_and_transition_data(lines, identifiers, tol=1.0):
 
     lvls = (
         []
     )  # lvls format is (energy, multiplicity, parity, rest of properties)
     trans = []  # trans format is (top level, bottom level, reduced matrix)
+    sorted_lvls = []  # (energy, index) of the levels sorted by energy
 
     a = ["X", "Y", "Z", "U", "V", "W", "A", "B"]
 
     zero_counter = (
         0  # zero counter required as to only read in the adopted values
     )
-    with open(file, "r", encoding="utf-8") as f:
-
-        for line in f:
-            # reading in level
-
-            if line.startswith(identifiers[0]):
-                temp, zero_counter = _read_levels(line, a, zero_counter)
-                lvls.append(temp)
+    for card, fields in _tokenize_ensdf(lines, identifiers):
+        # reading in level
 
+        if card == "L":
+            temp, zero_counter = _read_levels(fields, a, zero_counter)
             if zero_counter == 2:
-                lvls.pop(-1)
                 break
+            lvls.append(temp)
+            insort(sorted_lvls, (temp[0], len(lvls) - 1))
+
+        # reading in gamma info
 
-            # reading in gamma info
+        elif card == "G":
+            temp = _read_transition(fields, a, lvls, sorted_lvls, tol)
+            trans.append(temp)
 
-            if line.startswith(identifiers[1]):
-                temp = _read_transition(line, a, lvls)
-                trans.append(temp)
+        # only the first dataset with levels, normally the adopted levels,
+        # is read
 
-            if line.startswith(identifiers[2]):
-                trans[-1][-1] = line
+        elif card == "E":
+            if lvls:
+                break
+            trans = []
+
+        else:
+            trans[-1][-1] = fields
 
     return lvls, trans
 
@@ -356,32 +514,35 @@ def _extract_multi_parity(jpi):
         on if jpi clearly defined
 
     """
-    # first strip any available parentheses
-    jpi = jpi.replace("(", "")
-    jpi = jpi.replace(")", "")
+    return _parse_jpi(jpi)[:3]
+
+
+@lru_cache(maxsize=None)
+def _parse_jpi(jpi):
+    # Returns the multiplicity, parity, useability and possible (multiplicity,
+    # parity) of a J^pi field, cached on the raw field since the levels of a
+    # whole library share a few thousand distinct ones.
+    jpi = jpi.replace("(", "").replace(")", "")  # strip any parentheses
 
     if jpi == "":
-        multi = 10000
-        parity = "+"
-        useable = False
+        return 10000, "+", False, ()
 
-    elif "TO" in jpi or "," in jpi or ":" in jpi or "OR" in jpi:
-        useable = False
-        j_range = _get_jpi_range(jpi)
-        multi = j_range[0][0]
-        parity = j_range[0][1]
+    if "TO" in jpi or "," in jpi or ":" in jpi or "OR" in jpi:
+        j_range = tuple(tuple(j) for j in _get_jpi_range(jpi))
+        return j_range[0][0], j_range[0][1], False, j_range
 
+    if "+" not in jpi and "-" not in jpi:
+        parity = "+"
+        multi = _get_multiplicity(jpi)
     else:
-        if "+" not in jpi and "-" not in jpi:
-            parity = "+"
-            multi = int(2 * lp.Properties().evaluate_expression(jpi) + 1)
-            useable = True
-        else:
-            parity = jpi[-1]
-            multi = int(2 * lp.Properties().evaluate_expression(jpi[0:-1]) + 1)
-            useable = True
+        parity = jpi[-1]
+        multi = _get_multiplicity(jpi[0:-1])
 
-    return multi, parity, useable
+    return multi, parity, True, ((multi, parity),)
+
+
+def _get_multiplicity(j):
+    return int(2 * lp.Properties.evaluate_expression(j) + 1)
 
 
 def _get_file_sp_and_identifiers(match, sp, a):
@@ -431,58 +592,125 @@ def write_to_ensdf(coll, file):
     Returns:
         On successful return, the species collection has been written
     """
+    layouts = (
+        _compile_line_layout(_LEVEL_LINE, 19),
+        _compile_line_layout(_GAMMA_LINE, 9),
+    )
+
     with open(file, "w+", encoding="utf-8") as f:
-        for sp in coll.get():
+        buffer = []
+        for sp, species in coll.get().items():
 
             match = re.search(r"\d+", sp)
             a = int(match.group())  # mass number
             identifiers = _get_file_sp_and_identifiers(match, sp, a)
-            levels = coll.get()[sp].get_levels()
-            for lev in levels:
-                line = _construct_level_line(lev, identifiers)
-                f.write(line + "\n")
-                linked_levels = coll.get()[sp].get_lower_linked_levels(lev)
-                if linked_levels != []:
-                    for l_lev in linked_levels:
-                        transition = coll.get()[
-                            sp
-                        ].get_level_to_level_transition(lev, l_lev)
-                        line = _construct_gamma_line(transition, identifiers)
-                        f.write(line + "\n")
-                        if (
-                            transition.get_properties()[
-                                "Reduced_Matrix_Coefficient"
-                            ]
-                            != ""
-                        ):
-                            f.write(
-                                transition.get_properties()[
-                                    "Reduced_Matrix_Coefficient"
-                                ]
-                            )
+
+            for lines in _get_species_lines(species, identifiers, layouts):
+                buffer.extend(lines)
+                if len(buffer) >= _WRITE_CHUNK:
+                    f.write("".join(buffer))
+                    buffer = []
+
+        f.write("".join(buffer))
+
+
+def _get_species_lines(species, identifiers, layouts):
+    # Yields the lines of each level of a species: the level line, then the
+    # gamma line and reduced matrix coefficient line of each transition from
+    # the level, in the order the transitions are linked.
+    levels = species.get_levels()
+    lower_transitions = [[] for _ in levels]
+    for transition in species.get_transitions():
+        lower_transitions[
+            species.get_level_index(transition.get_upper_level())
+        ].append(transition)
+
+    for lev, transitions in zip(levels, lower_transitions):
+        lines = [_format_level_line(lev, identifiers, layouts[0])]
+        for transition in transitions:
+            lines.append(
+                _format_gamma_line(transition, identifiers, layouts[1])
+            )
+            rmc = transition.get_properties()["Reduced_Matrix_Coefficient"]
+            if rmc != "":
+                lines.append(rmc)
+        yield lines
+
+
+def _compile_line_layout(props, start):
+    # Compiles the columns of the fields of a line, from the start column to
+    # the end of the card, into (key, width, blank) pieces.  Single-column
+    # flags have a width of 0 and the gaps between fields a key of None.
+    layout = []
+    for key, indices in sorted(props.items(), key=lambda item: item[1][0]):
+        if indices[0] > start:
+            layout.append(
+                (None, indices[0] - start, " " * (indices[0] - start))
+            )
+        if len(indices) == 2:
+            width = indices[1] - indices[0]
+            layout.append((key, width, " " * width))
+        else:
+            layout.append((key, 0, " "))
+        start = indices[-1] if len(indices) == 2 else indices[0] + 1
+    if start < _CARD_WIDTH:
+        layout.append((None, _CARD_WIDTH - start, " " * (_CARD_WIDTH - start)))
+    return layout
+
+
+def _format_line(head, properties, layout):
+    # Fills the compiled layout of a line after its head, or returns None if
+    # a value does not fit its columns.
+    parts = [head]
+    for key, width, blank in layout:
+        if key is None or key not in properties:
+            parts.append(blank)
+            continue
+        value = str(properties[key])
+        if width == 0:
+            if len(value) != 1:
+                return None
+            parts.append(value)
+        else:
+            if len(value) > width:
+                return None
+            parts.append(value.center(width))
+    parts.append("\n")
+    return "".join(parts)
+
+
+def _format_level_line(lev, identifiers, layout):
+    head = identifiers[0] + " " + str(lev.get_energy()).center(19 - 9)
+    line = None
+    if len(head) == 19:
+        line = _format_line(head, lev.get_properties(), layout)
+    if line is None:
+        # values overflowing their columns shift the rest of the line
+        line = _construct_level_line(lev, identifiers) + "\n"
+    return line
+
+
+def _format_gamma_line(transition, identifiers, layout):
+    line = None
+    if len(identifiers[1]) == 8:
+        line = _format_line(
+            identifiers[1] + " ",
+            transition.get_properties(),
+            layout,
+        )
+    if line is None:
+        line = _construct_gamma_line(transition, identifiers) + "\n"
+    return line
 
 
 def _construct_level_line(lev, identifiers):
     energy = lev.get_energy()
     properties = lev.get_properties()
 
-    props = {
-        "energy_uncertainty": [19, 21],
-        "j^pi": [21, 39],
-        "half life": [39, 49],
-        "half life uncertainty": [49, 55],
-        "angular momentum transfer": [55, 64],
-        "spectroscopic strength": [64, 74],
-        "spectroscopic strength uncertainty": [74, 76],
-        "Comment flag": [76],
-        "isomer state": [77, 79],
-        "questionable character": [79],
-    }
-
     s = " " * 80
     s = identifiers[0] + s[8:]
     s = s[:9] + str(energy).center(19 - 9) + s[19:]
-    for key, indices in props.items():
+    for key, indices in _LEVEL_LINE.items():
         if key in properties and len(indices) == 2:
             s = (
                 s[: indices[0]]
@@ -497,29 +725,13 @@ def _construct_level_line(lev, identifiers):
 
 def _construct_gamma_line(transition, identifiers):
 
-    props = {
-        "E_gamma": [9, 19],
-        "Delta_E": [19, 21],
-        "Relative_Total_Intensity": [21, 29],
-        "Relative_Total_Intensity_Uncertainty": [29, 31],
-        "Transition_Multipolarity": [31, 41],
-        "Mixing_Ratio": [41, 49],
-        "Mixing_Ratio_Uncertainty": [49, 55],
-        "Total_Conversion_Coefficient": [55, 62],
-        "Total_Conversion_Coefficient_Uncertainty": [62, 64],
-        "Relative_Total_Transition_Intensity": [64, 74],
-        "Relative_Total_Transition_Intensity_Uncertainty": [74, 76],
-        "Comment": [76],
-        "Coincidence": [77],
-        "Question": [79],
-    }
     properties = transition.get_properties()
 
     s = " " * 80
 
     s = identifiers[1] + s[8:]
 
-    for key, indices in props.items():
+    for key, indices in _GAMMA_LINE.items():
         if key in properties and len(indices) == 2:
             s = (
                 s[: indices[0]]
@@ -549,141 +761,99 @@ def fill_missing_ensdf_transitions(sp, a):
     """
 
     levels = sp.get_levels()
-    for i in range(1, len(levels)):
-        for j in range(i):
-            if sp.get_level_to_level_transition(levels[i], levels[j]) is None:
-                ein_a = 0.0
-
-                jpi_i = levels[i].get_properties()["j^pi"]
-                jpi_j = levels[j].get_properties()["j^pi"]
-
-                e = [levels[i].get_energy(), levels[j].get_energy()]
-
-                if (
-                    levels[i].get_properties()["useability"] is False
-                    and levels[j].get_properties()["useability"] is True
-                ):
-
-                    sp.add_transition(
-                        lt.Transition(
-                            levels[i],
-                            levels[j],
-                            _get_ein_a_from_mixed_upper_level_to_lower(
-                                [e, ein_a, jpi_i, levels[j], a]
-                            ),
-                        )
-                    )
-                    continue
-
-                if (
-                    levels[i].get_properties()["useability"] is True
-                    and levels[j].get_properties()["useability"] is True
-                ):
-
-                    jj = [
-                        (levels[i].get_multiplicity() - 1) // 2,
-                        (levels[j].get_multiplicity() - 1) // 2,
-                    ]
-                    p = [
-                        levels[i].get_properties()["parity"],
-                        levels[j].get_properties()["parity"],
-                    ]
-                    p = lp.Properties().set_parity(p)
-                    sp.add_transition(
-                        lt.Transition(
-                            levels[i],
-                            levels[j],
-                            calc.Weisskopf().estimate(e, jj, p, a),
-                        )
-                    )
-                    continue
-
-                if (
-                    levels[i].get_properties()["useability"]
-                    and levels[j].get_properties()["useability"] is False
-                ):
-
-                    sp.add_transition(
-                        lt.Transition(
-                            levels[i],
-                            levels[j],
-                            _get_ein_a_to_mixed_lower_level(
-                                [e, ein_a, jpi_j, levels[i], a]
-                            ),
-                        )
-                    )
-                    continue
-
-                if (
-                    levels[i].get_properties()["useability"] is False
-                    and levels[j].get_properties()["useability"] is False
-                ):
-
-                    sp.add_transition(
-                        lt.Transition(
-                            levels[i],
-                            levels[j],
-                            _get_ein_a_from_mixed_to_mixed(
-                                [e, ein_a, jpi_i, jpi_j, a]
-                            ),
-                        )
-                    )
-                    continue
-
-
-def _get_ein_a_from_mixed_to_mixed(in_list):
-    jpi_i_range = _get_jpi_range(in_list[2])
-    jpi_j_range = _get_jpi_range(in_list[3])
-    for ki in jpi_i_range:
-        for kj in jpi_j_range:
-            jj = [(ki[0] - 1) // 2, (kj[0] - 1) // 2]
-            p = [ki[1], kj[1]]
-            p = lp.Properties().set_parity(p)
-            in_list[1] += (
-                calc.Weisskopf().estimate(in_list[0], jj, p, in_list[4])
-                / len(jpi_i_range)
-                / len(jpi_j_range)
-            )
 
-    return in_list[1]
+    # the pairs of an upper and a lower level without a transition
+    i_upper, i_lower = np.nonzero(np.tril(~sp.get_transition_adjacency(), -1))
 
+    allowed = _get_allowed_pairs(levels, i_upper, i_lower)
+    i_upper, i_lower = i_upper[allowed], i_lower[allowed]
 
-def _get_ein_a_to_mixed_lower_level(in_list):
+    # The levels with unclear J^pi contribute the average of the estimates
+    # over their possible J^pi, so every pair is expanded into the
+    # combinations of the candidates of its two levels.
+    pair, jpi_upper, jpi_lower, n_jpi = _expand_jpi_candidates(
+        levels, i_upper, i_lower
+    )
+    energies = np.array([lev.get_energy() for lev in levels])
+
+    ein_a = np.bincount(
+        pair,
+        weights=calc.Weisskopf(a).estimate_array(
+            [energies[i_upper[pair]], energies[i_lower[pair]]],
+            [jpi_upper[:, 0], jpi_lower[:, 0]],
+            [jpi_upper[:, 1], jpi_lower[:, 1]],
+            a,
+        )
+        / n_jpi[0]
+        / n_jpi[1],
+        minlength=len(i_upper),
+    )
 
-    jpi_j_range = _get_jpi_range(in_list[2])
+    sp.add_transitions(
+        [
+            lt.Transition(levels[i], levels[j], ein)
+            for i, j, ein in zip(i_upper, i_lower, ein_a.tolist())
+        ]
+    )
 
-    for k in jpi_j_range:
-        jj = [(in_list[3].get_multiplicity() - 1) // 2, (k[0] - 1) // 2]
-        p = [in_list[3].get_properties()["parity"], k[1]]
-        p = lp.Properties().set_parity(p)
-        in_list[1] += calc.Weisskopf().estimate(
-            in_list[0], jj, p, in_list[4]
-        ) / len(jpi_j_range)
 
-    return in_list[1]
+def _get_allowed_pairs(levels, i_upper, i_lower):
+    # Only the pairs that the useability of their levels allows are filled.
+    useability = [lev.get_properties()["useability"] for lev in levels]
+    u_true, u_false, u_set = (
+        np.array([f(u) for u in useability], dtype=bool)
+        for f in (lambda u: u is True, lambda u: u is False, bool)
+    )
 
+    return (
+        (u_false[i_upper] & u_true[i_lower])
+        | (u_true[i_upper] & u_true[i_lower])
+        | (u_set[i_upper] & u_false[i_lower])
+        | (u_false[i_upper] & u_false[i_lower])
+    )
 
-def _get_ein_a_from_mixed_upper_level_to_lower(in_list):
 
-    jpi_i_range = _get_jpi_range(in_list[2])
-    for k in jpi_i_range:
-        jj = [(k[0] - 1) // 2, (in_list[3].get_multiplicity() - 1) // 2]
-        p = [k[1], in_list[3].get_properties()["parity"]]
-        p = lp.Properties().set_parity(p)
-        in_list[1] += calc.Weisskopf().estimate(
-            in_list[0], jj, p, in_list[4]
-        ) / len(jpi_i_range)
-    return in_list[1]
+def _expand_jpi_candidates(levels, i_upper, i_lower):
+    # Returns, for every combination of the (J, parity) candidates of the
+    # levels of the pairs, the index of its pair, the candidates of the upper
+    # and lower level, and the numbers of candidates of both levels.
+    candidates = [_get_jpi_candidates(lev) for lev in levels]
+    counts = np.array([len(c) for c in candidates], dtype=int)
+    offsets = np.cumsum(counts) - counts
+    flat = np.array([c for cands in candidates for c in cands]).reshape(-1, 2)
+
+    n_comb = counts[i_upper] * counts[i_lower]
+    pair = np.repeat(np.arange(len(i_upper)), n_comb)
+    comb = np.arange(len(pair)) - np.repeat(np.cumsum(n_comb) - n_comb, n_comb)
+
+    return (
+        pair,
+        flat[offsets[i_upper[pair]] + comb // counts[i_lower[pair]]],
+        flat[offsets[i_lower[pair]] + comb % counts[i_lower[pair]]],
+        (counts[i_upper[pair]], counts[i_lower[pair]]),
+    )
 
 
-def _get_jpi_range(jpi):
+def _get_jpi_candidates(level):
+    # Returns the possible (J, parity) of a level, from its J^pi if it is
+    # flagged as not useable.
+    if level.get_properties()["useability"] is False:
+        return [
+            ((m - 1) // 2, 1 if p == "+" else -1)
+            for m, p in _parse_jpi(level.get_properties()["j^pi"])[3]
+        ]
+
+    return [
+        (
+            (level.get_multiplicity() - 1) // 2,
+            1 if level.get_properties()["parity"] == "+" else -1,
+        )
+    ]
 
-    # first strip any available parentheses
-    jpi = jpi.replace("(", "")
-    jpi = jpi.replace(")", "")
+
+def _get_jpi_range(jpi):
+    # the parentheses and blank fields are handled by _parse_jpi
     j_range = []
-    if jpi == "":
-        return j_range
     if "TO" in jpi or ":" in jpi:
         p = jpi[-1]
         if "TO" in jpi:
@@ -693,8 +863,8 @@ def _get_jpi_range(jpi):
 
         if "+" not in jpi and "-" not in jpi:
             p = "+"
-        m1 = int(2 * lp.Properties().evaluate_expression(jpi[0].strip(p)) + 1)
-        m2 = int(2 * lp.Properties().evaluate_expression(jpi[1].strip(p)) + 1)
+        m1 = _get_multiplicity(jpi[0].strip(p))
+        m2 = _get_multiplicity(jpi[1].strip(p))
         for i in range(m1, m2 + 1):
             j_range.append([i, p])
 
@@ -705,12 +875,12 @@ def _get_jpi_range(jpi):
             jpi = jpi.split(",")
         for j in jpi:
             if "+" not in j and "-" not in j:
-                m = int(2 * lp.Properties().evaluate_expression(j) + 1)
+                m = _get_multiplicity(j)
                 p = "+"
                 j_range.append([m, p])
             else:
                 p = j[-1]
-                m = int(2 * lp.Properties().evaluate_expression(j[0:-1]) + 1)
+                m = _get_multiplicity(j[0:-1])
                 j_range.append([m, p])
     return j_range
 
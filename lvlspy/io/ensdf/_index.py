@@ -0,0 +1,106 @@
+"""
+Module to index the nuclides of ENSDF files
+"""
+
+from io import StringIO
+import os
+import re
+import json
+
+__all__ = ["build_ensdf_index"]
+
+
+def build_ensdf_index(file, save=True):
+    """Method to index the level blocks of the nuclides in an ENSDF file.
+
+    Args:
+        ``file`` (:obj:`str`) The name of the ENSDF file.
+
+        ``save`` (:obj:`bool`, optional): If set to True, the index is saved as
+        JSON next to the file, in the file name with ``.index.json`` appended.
+        Defaults to True.
+
+    Returns:
+        :obj:`dict`: A dictionary with the ``size`` and modification time
+        ``mtime_ns`` of the file and, under ``species``, a dictionary giving
+        for each species name the [start, end) byte range of the first dataset
+        of the file with its level records, normally its adopted levels.
+
+    """
+
+    blocks = {}
+    with open(file, "rb") as f:
+        start = 0
+        nucid = None
+        has_levels = False
+        offset = 0
+        for raw in f:
+            line = raw.decode("utf-8")
+            if line.strip() == "":
+                if has_levels:
+                    blocks.setdefault(
+                        _get_species_name(nucid), [start, offset]
+                    )
+                nucid, has_levels = None, False
+            else:
+                if nucid is None:
+                    nucid, start = line[:5], offset
+                has_levels = has_levels or line[5:8] == "  L"
+            offset += len(raw)
+
+        if has_levels:
+            blocks.setdefault(_get_species_name(nucid), [start, offset])
+
+    stat = os.stat(file)
+    index = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "species": blocks,
+    }
+
+    if save:
+        with open(_get_index_file(file), "w", encoding="utf-8") as f:
+            json.dump(index, f)
+
+    return index
+
+
+def _get_index_file(file):
+    return str(file) + ".index.json"
+
+
+def _get_ensdf_index(file):
+    # Returns the saved index of a file if it is up to date, or a new one.
+    stat = os.stat(file)
+    try:
+        with open(_get_index_file(file), "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if (index["size"], index["mtime_ns"]) == (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+
+    try:
+        return build_ensdf_index(file)
+    except OSError:
+        return build_ensdf_index(file, save=False)
+
+
+def _read_ensdf_block(file, sp):
+    # Returns the indexed block of a species, to be read line by line.
+    start, end = _get_ensdf_index(file)["species"].get(sp, [0, 0])
+    with open(file, "rb") as f:
+        f.seek(start)
+        return StringIO(f.read(end - start).decode("utf-8"), newline=None)
+
+
+def _get_species_name(nucid):
+    # The species name, such as al26, of an ENSDF nuclide identifier.
+    nucid = nucid.strip()
+    match = re.match(r"(\d+)([A-Za-z]+)", nucid)
+    if match is None:
+        return nucid.lower()
+    return match.group(2).lower() + match.group(1)
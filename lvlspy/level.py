@@ -82,6 +82,8 @@ class Level(lp.Properties):
 
         self.energy = units_dict[units] * energy
 
+        self._notify_owners()
+
     def update_multiplicity(self, multiplicity):
         """Method to update the multiplicity for a level.
 
@@ -95,6 +97,8 @@ class Level(lp.Properties):
 
         self.multiplicity = multiplicity
 
+        self._notify_owners()
+
     def compute_boltzmann_factor(self, temperature):
         """Method to compute the Boltzmann factor for a level.
 
@@ -2,12 +2,15 @@
 
 import re
 
+_EXPRESSION = re.compile(r"(\d+|\+|\-|\*|\/)")
+
 
 class Properties:
     """A class for storing and retrieving optional properties."""
 
     def __init__(self):
         self.properties = {}
+        self._owners = []
 
     def get_properties(self):
         """Method to retrieve the optional properties.
@@ -33,10 +36,47 @@ class Properties:
 
         self.properties = {**self.properties, **properties}
 
-    def evaluate_expression(self, expression):
+        self._notify_owners()
+
+    def add_owner(self, owner):
+        """Method to register an object, such as a
+        :obj:`lvlspy.species.Species`, that holds this object.
+
+        Args:
+            ``owner`` (:obj:`lvlspy.species.Species`): The object holding
+            this object.  It is notified when this object is updated.
+
+        Returns:
+            On successful return, the owner has been registered.
+
+        """
+
+        if not any(x is owner for x in self._owners):
+            self._owners.append(owner)
+
+    def remove_owner(self, owner):
+        """Method to deregister an object holding this object.
+
+        Args:
+            ``owner`` (:obj:`lvlspy.species.Species`): The object to be
+            deregistered.
+
+        Returns:
+            On successful return, the owner has been deregistered.
+
+        """
+
+        self._owners = [x for x in self._owners if x is not owner]
+
+    def _notify_owners(self):
+        for owner in self._owners:
+            owner._member_updated(self)  # pylint: disable=protected-access
+
+    @staticmethod
+    def evaluate_expression(expression):
         """Method to extract range of jpi depending on ENSDF definition"""
         # Extract numbers and operators from the expression string
-        elements = re.findall(r"(\d+|\+|\-|\*|\/)", expression)
+        elements = _EXPRESSION.findall(expression)
 
         # Initialize the result to the first number
         result = int(elements[0])
@@ -1,11 +1,23 @@
 """Module to handle species."""
 
+from bisect import bisect_right
+from collections import OrderedDict
 import numpy as np
+from scipy.sparse import coo_matrix
+from gslconsts.consts import (
+    GSL_CONST_CGSM_ELECTRON_VOLT,
+    GSL_CONST_CGS_PLANCKS_CONSTANT_H,
+    GSL_CONST_CGS_SPEED_OF_LIGHT,
+    GSL_CONST_CGSM_BOLTZMANN,
+)
 import lvlspy.properties as lp
 import lvlspy.calculate as calc
 import lvlspy.transition as lt
 
+__all__ = ["Species"]
 
+
+# pylint: disable=too-many-instance-attributes,too-many-public-methods
 class Species(lp.Properties):
     """A class for storing and retrieving data about a species.
 
@@ -29,13 +41,226 @@ class Species(lp.Properties):
         self.levels = []
         self.transitions = []
         self.properties = {}
+        self._level_keys = {}
+        self._level_index = None
+        self._energies = []
+        self._lower_links = {}
+        self._upper_links = {}
+        self._cache = None
         if levels:
             for level in levels:
                 self.levels.append(level)
+                self._level_keys[id(level)] = level
+                level.add_owner(self)
+            self._sort_levels()
         if transitions:
             for transition in transitions:
                 self.add_transition(transition)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in [
+            "_level_keys",
+            "_level_index",
+            "_lower_links",
+            "_upper_links",
+        ]:
+            state.pop(key, None)
+        if self._cache is not None:
+            state["_cache"] = {
+                **self._cache,
+                "entries": OrderedDict(),
+                "transition_data": None,
+            }
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        # The index is keyed by object identity, so it must be rebuilt
+        # whenever the species is copied or unpickled.
+        self._level_keys = {id(level): level for level in self.levels}
+        self._level_index = None
+        self._lower_links = {}
+        self._upper_links = {}
+        for transition in self.transitions:
+            self._link_transition(transition)
+
+    def _sort_levels(self):
+        # Called on construction and whenever the energy of one of the
+        # levels is updated.  The sort is stable, so levels with equal
+        # energies keep their relative order.
+        self.levels.sort(key=lambda x: x.energy)
+        self._energies = [level.energy for level in self.levels]
+        self._level_index = None
+        self._invalidate_cache()
+
+    def _member_updated(self, member):
+        # Called by levels and transitions of the species when they are
+        # updated.
+        key = id(member)
+        if (
+            key in self._level_keys
+            and self._energies[self.get_level_index(member)] != member.energy
+        ):
+            self._sort_levels()
+        self._invalidate_cache()
+
+    def _invalidate_cache(self):
+        if self._cache is not None:
+            self._cache["entries"].clear()
+            self._cache["transition_data"] = None
+
+    def _get_cached(self, key, compute):
+        if self._cache is None:
+            return compute()
+
+        entries = self._cache["entries"]
+        if key in entries:
+            self._cache["hits"] += 1
+            entries.move_to_end(key)
+            return entries[key]
+
+        self._cache["misses"] += 1
+        result = compute()
+
+        # Cached results are shared between callers, so protect them
+        # from in-place modification.
+        if isinstance(result, np.ndarray):
+            result.flags.writeable = False
+        else:
+            result.data.flags.writeable = False
+
+        entries[key] = result
+        if len(entries) > self._cache["maxsize"]:
+            entries.popitem(last=False)
+
+        return result
+
+    def enable_cache(self, maxsize=32):
+        """Method to enable the caching of rate matrices and equilibrium
+        probabilities for a species.
+
+        Args:
+            ``maxsize`` (:obj:`int`, optional): The maximum number of
+            cached results.  When full, the least recently used result
+            is discarded.  Defaults to 32.
+
+        Returns:
+            On successful return, the cache has been enabled.  Cached
+            results are returned as read-only arrays and are discarded
+            whenever the levels, the transitions, or their data are
+            updated through the methods of the species, levels, or
+            transitions.
+
+        """
+
+        if self._cache is None:
+            self._cache = {
+                "maxsize": maxsize,
+                "hits": 0,
+                "misses": 0,
+                "entries": OrderedDict(),
+                "transition_data": None,
+            }
+        else:
+            self._cache["maxsize"] = maxsize
+            while len(self._cache["entries"]) > maxsize:
+                self._cache["entries"].popitem(last=False)
+
+    def disable_cache(self):
+        """Method to disable the caching of rate matrices and equilibrium
+        probabilities for a species.
+
+        Returns:
+            On successful return, the cache has been disabled and emptied.
+
+        """
+
+        self._cache = None
+
+    def clear_cache(self):
+        """Method to empty the cache of a species and reset its counters.
+
+        Returns:
+            On successful return, the cache has been cleared.
+
+        """
+
+        if self._cache is not None:
+            self._invalidate_cache()
+            self._cache["hits"] = 0
+            self._cache["misses"] = 0
+
+    def get_cache_info(self):
+        """Method to retrieve information about the cache of a species.
+
+        Returns:
+            :obj:`dict`: A dictionary with the number of cache ``hits`` and
+            ``misses``, the ``maxsize`` of the cache, and the current number
+            of cached results ``currsize``, or None if the cache is not
+            enabled.
+
+        """
+
+        if self._cache is None:
+            return None
+
+        return {
+            "hits": self._cache["hits"],
+            "misses": self._cache["misses"],
+            "maxsize": self._cache["maxsize"],
+            "currsize": len(self._cache["entries"]),
+        }
+
+    def _get_level_key(self, level):
+        key = id(level)
+        if (
+            key in self._level_keys
+            or key in self._lower_links
+            or key in self._upper_links
+        ):
+            return key
+
+        # Fall back on level equality for level objects that are not the
+        # ones stored in the species.
+        for known in self.levels:
+            if known == level:
+                return id(known)
+        for transition in self.transitions:
+            for known in [
+                transition.get_upper_level(),
+                transition.get_lower_level(),
+            ]:
+                if known == level:
+                    return id(known)
+
+        return key
+
+    def _link_transition(self, transition):
+        i_upper = self._get_level_key(transition.get_upper_level())
+        i_lower = self._get_level_key(transition.get_lower_level())
+        self._lower_links.setdefault(i_upper, {})[i_lower] = transition
+        self._upper_links.setdefault(i_lower, {})[i_upper] = transition
+
+    def _unlink_transition(self, i_upper, i_lower):
+        transition = self._lower_links[i_upper].pop(i_lower)
+        if not self._lower_links[i_upper]:
+            del self._lower_links[i_upper]
+        del self._upper_links[i_lower][i_upper]
+        if not self._upper_links[i_lower]:
+            del self._upper_links[i_lower]
+        return transition
+
+    def _find_transition_keys(self, upper_level, lower_level):
+        i_upper = self._get_level_key(upper_level)
+        i_lower = self._get_level_key(lower_level)
+        if i_lower in self._lower_links.get(i_upper, {}):
+            return i_upper, i_lower
+        return None
+
     def get_name(self):
         """Retrieve the name of the species.
 
@@ -71,10 +296,17 @@ class Species(lp.Properties):
 
         """
 
-        if level in self.get_levels():
-            self.remove_level(level)
+        key = self._get_level_key(level)
+        if key in self._level_keys:
+            self.remove_level(self._level_keys[key])
 
-        self.levels.append(level)
+        i = bisect_right(self._energies, level.energy)
+        self.levels.insert(i, level)
+        self._energies.insert(i, level.energy)
+        self._level_keys[id(level)] = level
+        self._level_index = None
+        level.add_owner(self)
+        self._invalidate_cache()
 
     def remove_level(self, level):
         """Method to remove a level from a species.
@@ -86,17 +318,23 @@ class Species(lp.Properties):
             On successful return, the level and all connected transitions have been removed.
 
         """
-        for _l in self.get_upper_linked_levels(level):
-            _t = self.get_level_to_level_transition(_l, level)
-            if _t:
-                self.remove_transition(_t)
+        key = self._get_level_key(level)
 
-        for _l in self.get_lower_linked_levels(level):
-            _t = self.get_level_to_level_transition(level, _l)
-            if _t:
-                self.remove_transition(_t)
+        for _t in list(self._upper_links.get(key, {}).values()):
+            self.remove_transition(_t)
 
-        self.levels.remove(level)
+        for _t in list(self._lower_links.get(key, {}).values()):
+            self.remove_transition(_t)
+
+        if key not in self._level_keys:
+            raise ValueError("Level not in species.")
+
+        i = self.get_level_index(level)
+        del self.levels[i]
+        del self._energies[i]
+        self._level_keys.pop(key).remove_owner(self)
+        self._level_index = None
+        self._invalidate_cache()
 
     def add_transition(self, transition):
         """Method to add a transition to a species.
@@ -112,10 +350,41 @@ class Species(lp.Properties):
 
         """
 
-        if transition in self.get_transitions():
+        if self._find_transition_keys(
+            transition.get_upper_level(), transition.get_lower_level()
+        ):
             self.remove_transition(transition)
 
         self.transitions.append(transition)
+        self._link_transition(transition)
+        transition.add_owner(self)
+        self._invalidate_cache()
+
+    def add_transitions(self, transitions):
+        """Method to add several transitions to a species at once.
+
+        Args:
+            ``transitions`` (:obj:`list`) A list of the
+            :obj:`lvlspy.transition.Transition` objects to be added.
+
+        Return:
+            On successful return, the transitions have been added.  If a
+            transition previously existed in the species, it has been
+            replaced with the new transition.
+
+        """
+
+        for transition in transitions:
+            if self._find_transition_keys(
+                transition.get_upper_level(), transition.get_lower_level()
+            ):
+                self.remove_transition(transition)
+
+            self.transitions.append(transition)
+            self._link_transition(transition)
+            transition.add_owner(self)
+
+        self._invalidate_cache()
 
     def remove_transition(self, transition):
         """Method to remove a transition from a species.
@@ -129,7 +398,19 @@ class Species(lp.Properties):
 
         """
 
-        self.transitions.remove(transition)
+        keys = self._find_transition_keys(
+            transition.get_upper_level(), transition.get_lower_level()
+        )
+        if keys is None:
+            raise ValueError("Transition not in species.")
+
+        stored = self._unlink_transition(*keys)
+        # Remove by identity, as equal transitions may join distinct levels.
+        del self.transitions[
+            next(i for i, t in enumerate(self.transitions) if t is stored)
+        ]
+        stored.remove_owner(self)
+        self._invalidate_cache()
 
     def get_lower_linked_levels(self, level):
         """Method to retrieve the lower-energy levels linked to the input level
@@ -145,12 +426,12 @@ class Species(lp.Properties):
 
         """
 
-        result = []
-        for transition in self.get_transitions():
-            if transition.get_upper_level() == level:
-                result.append(transition.get_lower_level())
-
-        return result
+        return [
+            transition.get_lower_level()
+            for transition in self._lower_links.get(
+                self._get_level_key(level), {}
+            ).values()
+        ]
 
     def get_upper_linked_levels(self, level):
         """Method to retrieve the higher-energy levels linked to the input level
@@ -166,12 +447,12 @@ class Species(lp.Properties):
 
         """
 
-        result = []
-        for transition in self.get_transitions():
-            if transition.get_lower_level() == level:
-                result.append(transition.get_upper_level())
-
-        return result
+        return [
+            transition.get_upper_level()
+            for transition in self._upper_links.get(
+                self._get_level_key(level), {}
+            ).values()
+        ]
 
     def get_level_to_level_transition(self, upper_level, lower_level):
         """Method to retrieve the downward transition from a particular
@@ -190,14 +471,11 @@ class Species(lp.Properties):
 
         """
 
-        for transition in self.get_transitions():
-            if (
-                transition.get_upper_level() == upper_level
-                and transition.get_lower_level() == lower_level
-            ):
-                return transition
+        keys = self._find_transition_keys(upper_level, lower_level)
+        if keys is None:
+            return None
 
-        return None
+        return self._lower_links[keys[0]][keys[1]]
 
     def get_levels(self):
         """Method to retrieve the levels for a species.
@@ -208,7 +486,32 @@ class Species(lp.Properties):
 
         """
 
-        return sorted(self.levels, key=lambda x: x.energy)
+        return list(self.levels)
+
+    def get_level_index(self, level):
+        """Method to retrieve the position of a level in the energy-sorted
+        list of levels of a species.
+
+        Args:
+            ``level`` (:obj:`lvlspy.level.Level`) The level whose index is
+            sought.
+
+        Returns:
+            :obj:`int`: The index of the level in the list returned by
+            :meth:`get_levels`.
+
+        """
+
+        if self._level_index is None:
+            self._level_index = {
+                id(lev): i for i, lev in enumerate(self.levels)
+            }
+
+        key = self._get_level_key(level)
+        if key not in self._level_index:
+            raise ValueError("Level not in species.")
+
+        return self._level_index[key]
 
     def get_transitions(self):
         """Method to retrieve the transitions for a species.
@@ -220,75 +523,288 @@ class Species(lp.Properties):
 
         return self.transitions
 
+    def get_transition_adjacency(self):
+        """Method to retrieve which levels of a species are linked by
+        transitions.
+
+        Returns:
+            :obj:`numpy.array`: A 2D boolean array whose element (i, j) is
+            True if the species has a transition from the level with index
+            i to the level with index j in the list returned by
+            :meth:`get_levels`.
+
+        """
+
+        adjacency = np.zeros((len(self.levels), len(self.levels)), dtype=bool)
+        for transition in self.transitions:
+            adjacency[
+                self.get_level_index(transition.get_upper_level()),
+                self.get_level_index(transition.get_lower_level()),
+            ] = True
+
+        return adjacency
+
     def compute_equilibrium_probabilities(self, temperature):
         """Method to compute the equilibrium probabilities for levels in a
         species.
 
         Args:
-            ``temperature`` (:obj:`float`): The temperature in K at which to
+            ``temperature`` (:obj:`float` or :obj:`numpy.array`): The
+            temperature in K, or a 1d array of temperatures, at which to
             compute the equilibrium probabilities.
 
             Returns:
                 :obj:`numpy.array`: A numpy array of the probabilities of the
-                levels.  The levels are sorted in ascending energy.
+                levels.  The levels are sorted in ascending energy.  For an
+                array of temperatures, the result is a 2d array of shape
+                (number of temperatures, number of levels).
 
         """
 
-        levs = self.get_levels()
+        if np.ndim(temperature) == 0:
+            return self._get_cached(
+                ("equilibrium_probabilities", float(temperature)),
+                lambda: self._equilibrium_probabilities([temperature])[0][0],
+            )
+
+        return self._equilibrium_probabilities(temperature)[0]
+
+    def compute_partition_function(self, temperature):
+        """Method to compute the partition function of a species.
 
-        prob = np.empty(len(levs))
+        Args:
+            ``temperature`` (:obj:`float` or :obj:`numpy.array`): The
+            temperature in K, or a 1d array of temperatures, at which to
+            compute the partition function.
 
-        for i, lev in enumerate(levs):
-            prob[i] = lev.compute_boltzmann_factor(temperature)
+            Returns:
+                :obj:`float` or :obj:`numpy.array`: The partition function,
+                the sum over levels of multiplicity * exp(-Energy/kT), at
+                each temperature.
 
-        prob /= np.sum(prob)
+        """
 
-        return prob
+        if np.ndim(temperature) == 0:
+            return self._equilibrium_probabilities([temperature])[1][0]
 
-    def compute_rate_matrix(self, temperature):
+        return self._equilibrium_probabilities(temperature)[1]
+
+    def _equilibrium_probabilities(self, temperatures):
+        # Shifts the exponents of the Boltzmann factors by their smallest
+        # value, so that neither the factors nor their sum overflow or
+        # underflow as a whole.  The shift is exact for the lowest level.
+
+        temperatures = np.asarray(temperatures, dtype=float)[:, np.newaxis]
+
+        energies = (
+            1.0e3
+            * GSL_CONST_CGSM_ELECTRON_VOLT
+            * np.array([lev.get_energy() for lev in self.levels])
+        )
+        multiplicities = np.array(
+            [lev.get_multiplicity() for lev in self.levels], dtype=float
+        )
+
+        k_bt = GSL_CONST_CGSM_BOLTZMANN * temperatures
+
+        # At zero temperature only the zero-energy levels are populated.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_p = np.where(
+                k_bt > 0,
+                energies / k_bt,
+                np.where(energies == 0, 0.0, np.inf),
+            )
+
+        x_min = np.min(x_p, axis=1, keepdims=True)
+
+        factors = multiplicities * np.exp(-(x_p - x_min))
+        sums = np.sum(factors, axis=1, keepdims=True)
+
+        return (
+            factors / sums,
+            np.exp(-x_min[:, 0]) * sums[:, 0],
+        )
+
+    def compute_rate_matrix(self, temperature, sparse=False):
         """Method to compute the rate matrix for a species.
 
         Args:
             ``temperature`` (:obj:`float`): The temperature in K at which to
             compute the rate matrix.
 
+            ``sparse`` (:obj:`bool`, optional): If set to True, the rate
+            matrix is built directly in sparse form from the transitions
+            and returned as a :obj:`scipy.sparse.csc_matrix`.  Defaults to
+            False.
+
             Returns:
-                :obj:`numpy.array`: A 2d numpy array giving the rate matrix.
+                :obj:`numpy.array`: A 2d numpy array giving the rate matrix,
+                or a :obj:`scipy.sparse.csc_matrix` if ``sparse`` is True.
 
         """
 
-        levels = self.get_levels()
-
-        rate_matrix = np.zeros((len(levels), len(levels)))
+        return self._get_cached(
+            ("rate_matrix", float(temperature), sparse),
+            lambda: self._rate_matrix(temperature, sparse),
+        )
+
+    def _rate_matrix(self, temperature, sparse):
+        if not sparse:
+            return self.compute_rate_matrices([temperature])[0]
+
+        data = self._get_transition_data()
+
+        r_upper_to_lower, r_lower_to_upper = self._compute_transition_rates(
+            data, temperature
+        )
+
+        n_levels = len(self.levels)
+        i_upper = data["i_upper"]
+        i_lower = data["i_lower"]
+
+        # Duplicate entries, as on the diagonal, are summed on conversion.
+        rate_matrix = coo_matrix(
+            (
+                np.concatenate(
+                    [
+                        r_upper_to_lower,
+                        -r_upper_to_lower,
+                        r_lower_to_upper,
+                        -r_lower_to_upper,
+                    ]
+                ),
+                (
+                    np.concatenate([i_lower, i_upper, i_upper, i_lower]),
+                    np.concatenate([i_upper, i_upper, i_lower, i_lower]),
+                ),
+            ),
+            shape=(n_levels, n_levels),
+        )
 
-        transitions = self.get_transitions()
+        return rate_matrix.tocsc()
 
-        for transition in transitions:
-            i_upper = levels.index(transition.get_upper_level())
-            i_lower = levels.index(transition.get_lower_level())
-            if (
-                "useable" in levels[i_upper].get_properties()
-                and levels[i_upper].get_properties()["useable"] is False
-            ) or (
-                "useable" in levels[i_lower].get_properties()
-                and levels[i_lower].get_properties()["useable"] is False
-            ):
-                continue
+    def compute_rate_matrices(self, temperatures):
+        """Method to compute the rate matrices for a species on a grid of
+        temperatures.
 
-            r_upper_to_lower = transition.compute_upper_to_lower_rate(
-                temperature
-            )
-            r_lower_to_upper = transition.compute_lower_to_upper_rate(
-                temperature
-            )
+        Args:
+            ``temperatures`` (:obj:`numpy.array`): A 1d array of the
+            temperatures in K at which to compute the rate matrices.
 
-            rate_matrix[i_lower, i_upper] += r_upper_to_lower
-            rate_matrix[i_upper, i_upper] -= r_upper_to_lower
+            Returns:
+                :obj:`numpy.array`: A 3d numpy array of shape
+                (number of temperatures, number of levels, number of levels)
+                giving the rate matrix at each temperature.  The
+                temperature-independent transition data are computed once
+                for the whole grid.
 
-            rate_matrix[i_upper, i_lower] += r_lower_to_upper
-            rate_matrix[i_lower, i_lower] -= r_lower_to_upper
+        """
 
-        return rate_matrix
+        temperatures = np.asarray(temperatures, dtype=float)
+
+        data = self._get_transition_data()
+
+        r_upper_to_lower, r_lower_to_upper = self._compute_transition_rates(
+            data, temperatures[:, np.newaxis]
+        )
+
+        n_levels = len(self.levels)
+        i_upper = data["i_upper"]
+        i_lower = data["i_lower"]
+        all_t = slice(None)
+
+        rate_matrices = np.zeros((len(temperatures), n_levels, n_levels))
+
+        np.add.at(rate_matrices, (all_t, i_lower, i_upper), r_upper_to_lower)
+        np.add.at(rate_matrices, (all_t, i_upper, i_upper), -r_upper_to_lower)
+
+        np.add.at(rate_matrices, (all_t, i_upper, i_lower), r_lower_to_upper)
+        np.add.at(rate_matrices, (all_t, i_lower, i_lower), -r_lower_to_upper)
+
+        return rate_matrices
+
+    def _get_transition_data(self):
+        if self._cache is None:
+            return self._pack_transition_data()
+
+        if self._cache["transition_data"] is None:
+            self._cache["transition_data"] = self._pack_transition_data()
+
+        return self._cache["transition_data"]
+
+    def _pack_transition_data(self):
+        # Pack the transitions between useable levels into arrays so that
+        # the rates can be computed for all transitions at once.
+
+        useable = [
+            lev.get_properties().get("useable", True) is not False
+            for lev in self.levels
+        ]
+
+        i_upper = []
+        i_lower = []
+        ein_a = []
+        for transition in self.transitions:
+            i_u = self.get_level_index(transition.get_upper_level())
+            i_l = self.get_level_index(transition.get_lower_level())
+            if useable[i_u] and useable[i_l]:
+                i_upper.append(i_u)
+                i_lower.append(i_l)
+                ein_a.append(transition.get_einstein_a())
+
+        i_upper = np.array(i_upper, dtype=int)
+        i_lower = np.array(i_lower, dtype=int)
+        ein_a = np.array(ein_a, dtype=float)
+
+        energies = np.array([lev.get_energy() for lev in self.levels])
+        multiplicities = np.array(
+            [lev.get_multiplicity() for lev in self.levels], dtype=float
+        )
+
+        # Transition energies in ergs and the frequency-dependent factor
+        # 2 h nu^3 / c^2 of the blackbody spectrum.
+        delta_e = (
+            1.0e3
+            * (energies[i_upper] - energies[i_lower])
+            * GSL_CONST_CGSM_ELECTRON_VOLT
+        )
+        fnu = (
+            2.0
+            * GSL_CONST_CGS_PLANCKS_CONSTANT_H
+            * np.power(delta_e / GSL_CONST_CGS_PLANCKS_CONSTANT_H, 3)
+            / np.power(GSL_CONST_CGS_SPEED_OF_LIGHT, 2)
+        )
+
+        b_upper_to_lower = ein_a / fnu
+
+        return {
+            "i_upper": i_upper,
+            "i_lower": i_lower,
+            "delta_e": delta_e,
+            "fnu": fnu,
+            "einstein_a": ein_a,
+            "einstein_b_upper_to_lower": b_upper_to_lower,
+            "einstein_b_lower_to_upper": b_upper_to_lower
+            * multiplicities[i_upper]
+            / multiplicities[i_lower],
+        }
+
+    def _compute_transition_rates(self, data, temperature):
+        # The temperature may be an array broadcastable against the
+        # transition data, in which case so are the rates.
+        x_p = data["delta_e"] / (GSL_CONST_CGSM_BOLTZMANN * temperature)
+        fnu = np.broadcast_to(data["fnu"], x_p.shape)
+
+        # Same branches as lvlspy.transition.Transition._bb.
+        bb = np.empty_like(x_p)
+        low = x_p < 500
+        bb[low] = fnu[low] / np.expm1(x_p[low])
+        bb[~low] = fnu[~low] * np.exp(-x_p[~low])
+
+        return (
+            data["einstein_a"] + data["einstein_b_upper_to_lower"] * bb,
+            data["einstein_b_lower_to_upper"] * bb,
+        )
 
     def fill_missing_transitions(self, a):
         """Method to fill in transitions between levels using a Weisskopf estimate.
@@ -302,27 +818,31 @@ class Species(lp.Properties):
         """
 
         levels = self.get_levels()
-        for i in range(1, len(levels)):
-            for j in range(i):
-                t_dummy = self.get_level_to_level_transition(
-                    levels[i], levels[j]
-                )
-                if t_dummy is None:
-
-                    e = [levels[i].get_energy(), levels[j].get_energy()]
-                    jj1 = [
-                        (levels[i].get_multiplicity() - 1) // 2,
-                        (levels[j].get_multiplicity() - 1) // 2,
-                    ]
-                    p1 = [
-                        levels[i].get_properties()["parity"],
-                        levels[j].get_properties()["parity"],
-                    ]
-
-                    p1 = lp.Properties().set_parity(p1)
-
-                    ein_a = calc.Weisskopf().estimate(e, jj1, p1, a)
 
-                    self.add_transition(
-                        lt.Transition(levels[i], levels[j], ein_a)
-                    )
+        # the pairs of an upper and a lower level without a transition
+        i_upper, i_lower = np.nonzero(
+            np.tril(~self.get_transition_adjacency(), -1)
+        )
+
+        energies = np.array([lev.get_energy() for lev in levels])
+        spins = np.array([(lev.get_multiplicity() - 1) // 2 for lev in levels])
+        parities = np.array(
+            [
+                1 if lev.get_properties()["parity"] == "+" else -1
+                for lev in levels
+            ]
+        )
+
+        ein_a = calc.Weisskopf(a).estimate_array(
+            [energies[i_upper], energies[i_lower]],
+            [spins[i_upper], spins[i_lower]],
+            [parities[i_upper], parities[i_lower]],
+            a,
+        )
+
+        self.add_transitions(
+            [
+                lt.Transition(levels[i], levels[j], ein)
+                for i, j, ein in zip(i_upper, i_lower, ein_a.tolist())
+            ]
+        )
@@ -89,6 +89,8 @@ class Transition(lp.Properties):
 
         self.einstein_a = einstein_a
 
+        self._notify_owners()
+
     def get_einstein_b_upper_to_lower(self):
         """Method to get the Einstein B coefficient for the upper level
         to lower level transition (induced emission).